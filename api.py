@@ -1,132 +1,250 @@
-import json
 import logging
+import pathlib
 import sqlite3
 
-import pandas as pd
-
-from models import Coordinates, Hint
+from clue_data import file_digest, iter_sections, map_digest
+from hint_index import HintIndex
+from metrics import span
+
+CLUE_COLUMNS = ("clue-id", "name-fr", "name-en", "name-es", "name-de", "name-pt")
+
+# Nearest map of every clue within 10 cells in a direction, answered from the covering
+# (y, x) index for horizontal directions and the (x, y) one for vertical directions
+NEAREST_QUERIES = {
+    "RIGHT": """
+        SELECT hint_id, MIN(x) - :x FROM clue_positions
+        WHERE y = :y AND x > :x AND x <= :x + 10 GROUP BY hint_id
+    """,
+    "LEFT": """
+        SELECT hint_id, :x - MAX(x) FROM clue_positions
+        WHERE y = :y AND x < :x AND x >= :x - 10 GROUP BY hint_id
+    """,
+    "DOWN": """
+        SELECT hint_id, MIN(y) - :y FROM clue_positions
+        WHERE x = :x AND y > :y AND y <= :y + 10 GROUP BY hint_id
+    """,
+    "UP": """
+        SELECT hint_id, :y - MAX(y) FROM clue_positions
+        WHERE x = :x AND y < :y AND y >= :y - 10 GROUP BY hint_id
+    """,
+}
 
 
 class API:
-    def __init__(self):
+    def __init__(self, corrections=None, remote=None, path="data/treasure_hunt.db"):
+        """
+        :param corrections: Corrections overlay merged into every lookup
+        :param remote: TreasureHuntAPI queried when the local data has no answer, the
+            directions of the target it finds are then fetched in the background
+        :param path: SQLite database built from the clue dump
+        """
         self.logger = logging.getLogger("api")
-        self.conn = sqlite3.connect("data/treasure_hunt.db")
+        self.path = path
+        self._conn = None
+        self.reader = None
+        self.index = None
+        self.corrections = corrections
+        self.remote = remote
+
+    @property
+    def conn(self):
+        """
+        Read-write connection, only opened when the database is built or exported.
+        """
+        if self._conn is None:
+            # The hotkey callback runs on the keyboard hook thread
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        return self._conn
+
+    def get_reader(self):
+        """
+        :return: Long-lived read-only connection. It keeps the file locking, as
+            other processes may rebuild the database while it is open.
+        """
+        if self.reader is None:
+            uri = f"{pathlib.Path(self.path).resolve().as_uri()}?mode=ro"
+            self.reader = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return self.reader
+
+    def nearest_clues(self, current_coords, direction):
+        """
+        :return: Dictionary of clue id to the distance of its nearest map in direction,
+            for the clues with a map within 10 cells
+        """
+        query = NEAREST_QUERIES[direction]
+        params = {"x": current_coords.x, "y": current_coords.y}
+        # The module keeps its statements prepared, the queries being constant strings
+        return dict(self.get_reader().execute(query, params))
 
     def find_distance(self, hint, current_coords, direction):
-        items = self.get_hints(current_coords, direction)
-
-        return items
+        """
+        :return: Distance to the nearest map of the best matching clue, or None
+        """
+        index = self.get_index()
+        if self.corrections is not None:
+            self.corrections.reload()
+        distances = self.nearest_clues(current_coords, direction)
+        for clue_id, _ in index.resolve(hint.text):
+            if self.corrections is not None and clue_id in self.corrections.touched:
+                distance = index.distance(current_coords.x, current_coords.y, direction, clue_id)
+            else:
+                distance = distances.get(clue_id)
+            if distance:
+                return distance
+        return None
 
     def get_hint_coordinates(self, current_coords, direction, hint):
-        query = ""
-        params = (0, 0, 0)
-        if direction == "RIGHT":
-            query = """
-                SELECT name_fr, x, y
-                FROM hints_coordinates
-                WHERE y = ?
-                AND x BETWEEN ? AND ?
-                ORDER BY x ASC
-            """
-            params = (current_coords.y, current_coords.x, int(current_coords.x) + 10)
-
-        elif direction == "DOWN":
-            query = """
-                SELECT name_fr, x, y
-                FROM hints_coordinates
-                WHERE x = ?
-                AND y BETWEEN ? AND ?
-                ORDER BY y ASC
-            """
-            params = (current_coords.x, current_coords.y, int(current_coords.y) + 10)
-
-        elif direction == "LEFT":
-            query = """
-                SELECT name_fr, x, y
-                FROM hints_coordinates
-                WHERE y = ?
-                AND x BETWEEN ? AND ?
-                ORDER BY x ASC
-            """
-            params = (current_coords.y, int(current_coords.x) - 10, current_coords.x)
-
-        elif direction == "UP":
-            query = """
-                SELECT name_fr, x, y
-                FROM hints_coordinates
-                WHERE x = ?
-                AND y BETWEEN ? AND ?
-                ORDER BY y ASC
-            """
-            params = (current_coords.x, int(current_coords.y) - 10, current_coords.y)
-
-        cursor = self.conn.cursor()
-        cursor.execute(query, params)
-        items = cursor.fetchall()
-        hint_coords = {}
-        hint_partial_match_coords = {}
-        for item in items:
-            key_hint = Hint(item[0]).sanitize()
-            coords = Coordinates(x=item[1], y=item[2])
-            if coords != current_coords:
-                if key_hint.text in hint_coords.keys():
-                    self.logger.debug(
-                        f"Check if {key_hint} ,{coords} at {coords.get_distance(current_coords)} is less than {hint_coords[key_hint.text]}{hint_coords[key_hint.text].get_distance(current_coords)}"
-                    )
-                    if coords.get_distance(current_coords) < hint_coords[
-                        key_hint.text
-                    ].get_distance(current_coords):
-                        hint_coords[key_hint.text] = coords
-                    else:
-                        coords = hint_coords[key_hint.text]
-                else:
-                    hint_coords[key_hint.text] = coords
-                words = key_hint.text.split()
-                for i in range(1, len(words) + 1):
-                    for j in range(len(words) - i + 1):
-                        partial_key = " ".join(words[j : j + i])
-                        hint_partial_match_coords[partial_key] = coords
-        target_coords = hint_coords.get(hint.text)
-        if not target_coords:
-            self.logger.info(f"Hint {hint} not found, partial match")
-            target_coords = hint_partial_match_coords.get(hint.text)
+        with span("lookup"):
+            target_coords = self.get_index().lookup(current_coords, direction, hint)
+        if target_coords is None and self.remote is not None:
+            self.logger.info(f"No local answer for {hint}, querying the remote API")
+            with span("remote_lookup"):
+                target_coords = self.remote.solve(current_coords, direction, hint)
+            if target_coords is not None:
+                # The local data is missing clues around here, the next step will need
+                # the remote API too
+                self.remote.prefetch(target_coords, wait=False)
         return target_coords
 
-    def build_db(self):
+    def get_index(self):
+        if self.index is None:
+            self.index = HintIndex.from_connection(self.get_reader())
+            self.index.corrections = self.corrections
+        return self.index
+
+    def build_db(self, source="data/clues_full.json"):
+        """
+        Bring the database up to date with a clue dump.
+
+        Nothing is done when the dump hash matches the one of the last build.
+        Otherwise the maps section is streamed and only the maps whose position or
+        clues changed are rewritten.
+        """
+        source_digest = file_digest(source)
+        self._create_schema()
+        row = self.conn.execute(
+            "SELECT value FROM build_state WHERE key = 'source_digest'"
+        ).fetchone()
+        if row and row[0] == source_digest:
+            # Databases built before clue_positions existed only need it filled in
+            if self.conn.execute("SELECT 1 FROM clue_positions LIMIT 1").fetchone() is None:
+                with self.conn:
+                    self._refresh_positions()
+                self._reset_reader()
+            self.logger.info("Database is up to date")
+            return
+
         print("Building database...")
         self.logger.info("Building database...")
-        hint_and_maps = json.load(open("data/clues_full.json"))
-        hints_df = pd.DataFrame(hint_and_maps["clues"])
-        hints_df = hints_df.rename(columns={"clue-id": "hint-id"})
-        hints_df.columns = hints_df.columns.str.replace("-", "_")
-
-        maps = hint_and_maps["maps"]
-
-        hint_ids = []
-        x_coords = []
-        y_coords = []
-
-        for _, details in maps.items():
-            position = details.get("position", {})
-            x = position.get("x", 0)
-            y = position.get("y", 0)
-            clues = details.get("clues", [])
-
-            for clue in clues:
-                hint_ids.append(clue)
-                x_coords.append(x)
-                y_coords.append(y)
-
-        maps_df = pd.DataFrame({"hint_id": hint_ids, "x": x_coords, "y": y_coords})
-        maps_df = maps_df.drop_duplicates()
-        hints_coordinates = hints_df.merge(maps_df, on="hint_id")
-        hints_coordinates.to_sql("hints_coordinates", self.conn, if_exists="replace", index=False)
+        known_digests = dict(self.conn.execute("SELECT map_id, digest FROM maps"))
+        seen = set()
+        changed = 0
+        with self.conn:
+            for section, map_id, details in iter_sections(source):
+                if section == "clues":
+                    self.conn.execute("DELETE FROM clues")
+                    self.conn.executemany(
+                        "INSERT INTO clues VALUES (?, ?, ?, ?, ?, ?)",
+                        (tuple(clue.get(column) for column in CLUE_COLUMNS) for clue in details),
+                    )
+                elif section == "maps":
+                    seen.add(map_id)
+                    position = details.get("position", {})
+                    x = position.get("x", 0)
+                    y = position.get("y", 0)
+                    clues = set(details.get("clues", []))
+                    digest = map_digest(x, y, clues)
+                    if known_digests.get(map_id) == digest:
+                        continue
+                    changed += 1
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO maps VALUES (?, ?, ?, ?)", (map_id, x, y, digest)
+                    )
+                    self.conn.execute("DELETE FROM map_clues WHERE map_id = ?", (map_id,))
+                    self.conn.executemany(
+                        "INSERT INTO map_clues VALUES (?, ?)",
+                        ((map_id, clue) for clue in clues),
+                    )
+
+            removed = [(map_id,) for map_id in known_digests.keys() - seen]
+            self.conn.executemany("DELETE FROM map_clues WHERE map_id = ?", removed)
+            self.conn.executemany("DELETE FROM maps WHERE map_id = ?", removed)
+            self._refresh_positions()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO build_state VALUES ('source_digest', ?)", (source_digest,)
+            )
+
+        self._reset_reader()
+        self.logger.info(
+            f"Database built successfully: {changed} maps updated, {len(removed)} removed"
+        )
+
+    def _refresh_positions(self):
+        self.conn.execute("DELETE FROM clue_positions")
         self.conn.execute("""
-            CREATE INDEX IF NOT EXISTS hints_coordinates_hint_id_x_y_index
-            ON hints_coordinates (name_fr, x, y)
+            INSERT OR IGNORE INTO clue_positions
+            SELECT map_clues.hint_id, maps.x, maps.y
+            FROM map_clues
+            JOIN maps ON maps.map_id = map_clues.map_id
         """)
 
-        self.logger.info("Database built successfully")
+    def _reset_reader(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        self.index = None
+
+    def _create_schema(self):
+        # Databases built before the incremental build hold a flat table
+        row = self.conn.execute(
+            "SELECT type FROM sqlite_master WHERE name = 'hints_coordinates'"
+        ).fetchone()
+        if row and row[0] == "table":
+            self.conn.execute("DROP TABLE hints_coordinates")
+
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS clues (
+                hint_id INTEGER PRIMARY KEY,
+                name_fr TEXT,
+                name_en TEXT,
+                name_es TEXT,
+                name_de TEXT,
+                name_pt TEXT
+            );
+            CREATE TABLE IF NOT EXISTS maps (
+                map_id TEXT PRIMARY KEY,
+                x INTEGER,
+                y INTEGER,
+                digest TEXT
+            );
+            CREATE TABLE IF NOT EXISTS map_clues (
+                map_id TEXT,
+                hint_id INTEGER,
+                PRIMARY KEY (map_id, hint_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS map_clues_hint_id_index ON map_clues (hint_id);
+            CREATE TABLE IF NOT EXISTS clue_positions (
+                hint_id INTEGER,
+                x INTEGER,
+                y INTEGER,
+                PRIMARY KEY (hint_id, x, y)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS clue_positions_yx_index
+                ON clue_positions (y, x, hint_id);
+            CREATE INDEX IF NOT EXISTS clue_positions_xy_index
+                ON clue_positions (x, y, hint_id);
+            CREATE TABLE IF NOT EXISTS build_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE VIEW IF NOT EXISTS hints_coordinates AS
+                SELECT DISTINCT clues.*, maps.x, maps.y
+                FROM map_clues
+                JOIN maps ON maps.map_id = map_clues.map_id
+                JOIN clues ON clues.hint_id = map_clues.hint_id;
+        """)
 
     def table_to_df(self, table_name):
+        import pandas as pd
+
         return pd.read_sql(f"SELECT * FROM {table_name}", self.conn)
@@ -0,0 +1,80 @@
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger("arrow_classifier")
+
+# Cardinal direction of each 90 degree sector, image y axis pointing down
+_SECTORS = ("RIGHT", "DOWN", "LEFT", "UP")
+
+
+def classify_arrow(arrow_crop):
+    """
+    Find the direction of the arrow drawn in a crop.
+
+    The largest contour is taken as the arrow. Its two extremities are the contour
+    points farthest from the centroid, and the head is the one with fewer contour
+    points around it, since it is the most pointed.
+
+    :param arrow_crop: BGR image of the arrow column next to the hint
+    :return: Tuple of (direction, confidence), direction being None if not found.
+        The confidence combines how close the arrow is to a cardinal axis with how
+        clearly the head stands out from the tail.
+    """
+    if arrow_crop is None or arrow_crop.size == 0:
+        return None, 0.0
+
+    gray = cv2.cvtColor(arrow_crop, cv2.COLOR_BGR2GRAY)
+    edges = cv2.Canny(gray, 50, 150)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        logger.warning("No contours found in arrow detection")
+        return None, 0.0
+
+    arrow_contour = max(contours, key=cv2.contourArea)
+    moments = cv2.moments(arrow_contour)
+    if moments["m00"] == 0:
+        logger.warning("Could not compute moments for arrow contour")
+        return None, 0.0
+    centroid = np.array(
+        [int(moments["m10"] / moments["m00"]), int(moments["m01"] / moments["m00"])],
+        dtype=np.float32,
+    )
+
+    points = arrow_contour.reshape(-1, 2).astype(np.float32)
+    to_centroid = np.linalg.norm(points - centroid, axis=1)
+    farthest = int(np.argmax(to_centroid))
+    max_dist = to_centroid[farthest]
+    to_farthest = np.linalg.norm(points - points[farthest], axis=1)
+
+    # The other extremity is the farthest point from the centroid that is also far
+    # from the first one
+    candidates = np.where(to_farthest > max_dist * 0.7, to_centroid, 0)
+    second = int(np.argmax(candidates))
+    if candidates[second] <= 0:
+        logger.warning("Could not determine arrow direction")
+        return None, 0.0
+    to_second = np.linalg.norm(points - points[second], axis=1)
+
+    radius = max_dist * 0.2
+    farthest_neighbors = int(np.count_nonzero(to_farthest < radius))
+    second_neighbors = int(np.count_nonzero(to_second < radius))
+    if farthest_neighbors < second_neighbors:
+        head, tail = points[farthest], points[second]
+    else:
+        head, tail = points[second], points[farthest]
+
+    dx, dy = head - tail
+    angle = float(np.degrees(np.arctan2(dy, dx)))
+    direction = _SECTORS[int(((angle + 45) % 360) // 90)]
+
+    axis_offset = abs((angle + 45) % 90 - 45)
+    alignment = 1 - axis_offset / 45
+    contrast = abs(farthest_neighbors - second_neighbors) / max(
+        farthest_neighbors + second_neighbors, 1
+    )
+    confidence = alignment * (0.5 + 0.5 * contrast)
+
+    logger.info(f"Arrow direction identified: {direction} ({confidence:.2f})")
+    return direction, confidence
@@ -0,0 +1,208 @@
+import argparse
+import contextlib
+import csv
+import json
+import logging
+import random
+import sys
+import time
+from collections import OrderedDict
+
+from api import API
+from corrections import Corrections
+from hint_index import DIRECTIONS, STEPS, HintIndex
+from models import normalize
+
+logger = logging.getLogger("bulk_solve")
+
+OUTPUT_FIELDS = (
+    "x",
+    "y",
+    "direction",
+    "hint",
+    "target_x",
+    "target_y",
+    "clue_id",
+    "score",
+    "error",
+)
+
+
+class BulkSolver:
+    """
+    Resolve many (x, y, direction, hint) queries against one shared HintIndex.
+
+    Hint strings are sanitized and matched once per distinct value, so a batch costs
+    one grid read per row once its hints have been seen. The corrections overlay,
+    when given, is merged into the distances as for single lookups.
+    """
+
+    def __init__(self, index, corrections=None, max_hints=4096):
+        """
+        :param corrections: Corrections overlay merged into every query
+        :param max_hints: Distinct hint strings whose candidates are kept
+        """
+        self.index = index
+        if corrections is not None:
+            self.index.corrections = corrections
+        self.max_hints = max_hints
+        self.candidates = OrderedDict()
+
+    def _candidates(self, hint):
+        candidates = self.candidates.get(hint)
+        if candidates is None:
+            candidates = self.index.resolve(normalize(hint))
+            self.candidates[hint] = candidates
+            while len(self.candidates) > self.max_hints:
+                self.candidates.popitem(last=False)
+        else:
+            self.candidates.move_to_end(hint)
+        return candidates
+
+    def solve(self, rows):
+        """
+        :param rows: Iterable of mappings with x, y, direction and hint
+        :return: Generator of result dicts with OUTPUT_FIELDS, a malformed row yields
+            its values as read with the reason in error
+        """
+        if self.index.corrections is not None:
+            self.index.corrections.reload()
+        for row in rows:
+            try:
+                yield self._solve_row(row)
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                logger.warning(f"Malformed row {row}: {e!r}")
+                values = row if isinstance(row, dict) else {}
+                yield {
+                    **{field: None for field in OUTPUT_FIELDS},
+                    **{field: values.get(field) for field in ("x", "y", "direction", "hint")},
+                    "error": f"{type(e).__name__}: {e}",
+                }
+
+    def _solve_row(self, row):
+        if "error" in row:
+            raise ValueError(row["error"])
+        x, y = int(row["x"]), int(row["y"])
+        direction = row["direction"].upper()
+        if direction not in STEPS:
+            raise ValueError(f"Unknown direction {row['direction']}")
+        result = {
+            "x": x,
+            "y": y,
+            "direction": direction,
+            "hint": row["hint"],
+            "target_x": None,
+            "target_y": None,
+            "clue_id": None,
+            "score": None,
+            "error": None,
+        }
+        best = self.index.best_candidate(x, y, direction, self._candidates(row["hint"]))
+        if best is not None:
+            clue_id, score, distance = best
+            step_x, step_y = STEPS[direction]
+            result["target_x"] = x + step_x * distance
+            result["target_y"] = y + step_y * distance
+            result["clue_id"] = clue_id
+            result["score"] = score
+        return result
+
+
+def read_rows(f, fmt):
+    if fmt == "csv":
+        yield from csv.DictReader(f)
+    else:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                # Still yielded, so that the output keeps one line per query
+                yield {"error": f"Invalid JSON on line {number}: {e}"}
+
+
+def write_rows(f, fmt, results):
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_FIELDS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow(result)
+            count += 1
+    else:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+            count += 1
+    return count
+
+
+def synthetic_rows(index, count, seed=0):
+    """
+    :return: Generator of random queries over the index grid and clue names
+    """
+    rng = random.Random(seed)
+    names = list(index.clue_names.values())
+    for _ in range(count):
+        yield {
+            "x": rng.randrange(index.min_x, index.min_x + index.width),
+            "y": rng.randrange(index.min_y, index.min_y + index.height),
+            "direction": rng.choice(DIRECTIONS),
+            "hint": rng.choice(names),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve a batch of hint queries")
+    parser.add_argument("input", nargs="?", help="JSONL or CSV queries, stdin if omitted")
+    parser.add_argument("-o", "--output", help="Result file, stdout if omitted")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="Defaults to the extension")
+    parser.add_argument("--source", help="Build the index from a clue dump instead of the db")
+    parser.add_argument("--synthetic", type=int, help="Solve this many random queries instead")
+    parser.add_argument(
+        "--corrections", default="data/corrections.jsonl", help="Corrections overlay file"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        stream=sys.stderr,
+    )
+
+    fmt = args.format
+    if fmt is None:
+        path = args.input or args.output or ""
+        fmt = "csv" if path.endswith(".csv") else "jsonl"
+
+    if args.source:
+        index = HintIndex.from_json(args.source)
+    else:
+        api = API()
+        api.build_db()
+        index = api.get_index()
+    solver = BulkSolver(index, Corrections(args.corrections))
+
+    start = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        input_file = sys.stdin
+        if args.input and not args.synthetic:
+            input_file = stack.enter_context(open(args.input, encoding="utf-8", newline=""))
+        output_file = sys.stdout
+        if args.output:
+            output_file = stack.enter_context(open(args.output, "w", encoding="utf-8", newline=""))
+        if args.synthetic:
+            rows = synthetic_rows(index, args.synthetic)
+        else:
+            rows = read_rows(input_file, fmt)
+        count = write_rows(output_file, fmt, solver.solve(rows))
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Solved {count} queries in {elapsed:.2f} seconds "
+        f"({count / max(elapsed, 1e-9):,.0f} queries/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
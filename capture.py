@@ -0,0 +1,279 @@
+import abc
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+from metrics import timed
+
+logger = logging.getLogger("capture")
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+BACKENDS = ("windows", "x11", "replay")
+
+
+def _resolve_roi(roi, width, height):
+    if roi is None:
+        return 0, height, 0, width
+    if callable(roi):
+        roi = roi(width, height)
+    y_min, y_max, x_min, x_max = roi
+    return max(y_min, 0), min(y_max, height), max(x_min, 0), min(x_max, width)
+
+
+class CaptureBackend(abc.ABC):
+    """
+    Source of game window frames.
+
+    capture_window() returns a BGR array of the whole window size, but only the
+    requested region of interest is grabbed into it, so the crops taken with window
+    coordinates stay valid while the rest of the frame is never read. The array is a
+    buffer reused by the next capture, callers keeping a frame must copy it.
+    """
+
+    def __init__(self):
+        self.buffer = None
+
+    @abc.abstractmethod
+    def window_size(self):
+        """
+        :return: Tuple of (width, height) of the window
+        """
+
+    @abc.abstractmethod
+    def _grab(self, out, left, top):
+        """
+        Write the window pixels whose top left corner is (left, top) into out.
+        """
+
+    def is_foreground(self):
+        """
+        :return: Whether the captured pixels are those of the window, which a grab of
+            the screen only guarantees while the window is in the foreground
+        """
+        return True
+
+    @timed("capture")
+    def capture_window(self, roi=None):
+        """
+        :param roi: (y_min, y_max, x_min, x_max) region to grab, or a callable returning
+            it from the window (width, height), the whole window if None
+        :return: Window frame as a BGR numpy array
+        """
+        width, height = self.window_size()
+        if self.buffer is None or self.buffer.shape[:2] != (height, width):
+            self.buffer = np.zeros((height, width, 3), dtype=np.uint8)
+        y_min, y_max, x_min, x_max = _resolve_roi(roi, width, height)
+        if y_max > y_min and x_max > x_min:
+            self._grab(self.buffer[y_min:y_max, x_min:x_max], x_min, y_min)
+        return self.buffer
+
+    def close(self):
+        pass
+
+
+class ScreenCapture(CaptureBackend):
+    """
+    Capture the screen area of a window through mss.
+
+    mss hands out raw BGRA pixels, so a grab is one copy of the region into the
+    buffer without any intermediate image or color conversion.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # mss keeps a display connection that cannot be shared between threads
+        self._local = threading.local()
+
+    @abc.abstractmethod
+    def window_origin(self):
+        """
+        :return: Tuple of (left, top) screen position of the window
+        """
+
+    def _screen(self):
+        screen = getattr(self._local, "screen", None)
+        if screen is None:
+            import mss
+
+            screen = self._local.screen = mss.mss()
+        return screen
+
+    def _grab(self, out, left, top):
+        window_left, window_top = self.window_origin()
+        height, width = out.shape[:2]
+        region = {"left": window_left + left, "top": window_top + top}
+        shot = self._screen().grab({**region, "width": width, "height": height})
+        pixels = np.frombuffer(shot.raw, dtype=np.uint8).reshape(height, width, 4)
+        np.copyto(out, pixels[:, :, :3])
+
+    def close(self):
+        screen = getattr(self._local, "screen", None)
+        if screen is not None:
+            screen.close()
+            self._local.screen = None
+
+
+class X11Capture(ScreenCapture):
+    """
+    Capture a window of an X11 session, locating it with xdotool.
+    """
+
+    def __init__(self, window_title, refresh_interval=1.0):
+        """
+        :param window_title: Title or partial title of the window
+        :param refresh_interval: Seconds the window geometry is trusted before being
+            queried again, in case the window moved
+        """
+        super().__init__()
+        if shutil.which("xdotool") is None:
+            raise RuntimeError("The X11 capture backend needs xdotool to locate windows")
+        self.window_title = window_title
+        self.refresh_interval = refresh_interval
+        self.geometry = None
+        self.geometry_time = 0.0
+        self._find_window()
+
+    def _find_window(self):
+        result = subprocess.run(
+            ["xdotool", "search", "--onlyvisible", "--name", self.window_title],
+            capture_output=True,
+            text=True,
+            # xdotool exits with an error when no window matches, reported below
+            check=False,
+        )
+        window_ids = result.stdout.split()
+        if not window_ids:
+            logger.error(f"No window found with title containing: {self.window_title}")
+            raise ValueError(f"No window found with title containing: {self.window_title}")
+        if len(window_ids) > 1:
+            logger.warning(
+                f"{len(window_ids)} windows match '{self.window_title}', using the first. "
+                "Give a more specific title to pick another"
+            )
+        self.window_id = window_ids[0]
+        logger.info(f"Found window {self.window_id} for '{self.window_title}'")
+
+    def _geometry(self):
+        now = time.monotonic()
+        if self.geometry is None or now - self.geometry_time > self.refresh_interval:
+            result = subprocess.run(
+                ["xdotool", "getwindowgeometry", "--shell", self.window_id],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            values = dict(line.split("=", 1) for line in result.stdout.split())
+            self.geometry = tuple(int(values[key]) for key in ("X", "Y", "WIDTH", "HEIGHT"))
+            self.geometry_time = now
+        return self.geometry
+
+    def window_origin(self):
+        return self._geometry()[:2]
+
+    def is_foreground(self):
+        result = subprocess.run(
+            ["xdotool", "getactivewindow"], capture_output=True, text=True, check=False
+        )
+        return result.stdout.strip() == self.window_id
+
+    def window_size(self):
+        return self._geometry()[2:]
+
+
+class ReplayCapture(CaptureBackend):
+    """
+    Deterministic capture source playing back saved frames, either the images of a
+    directory in name order or the frames of a video file.
+
+    cv2 is imported on use, so that listing the backends stays cheap.
+    """
+
+    def __init__(self, source, loop=True):
+        """
+        :param source: Directory of captures or video file
+        :param loop: Start over once the last frame has been returned
+        """
+        super().__init__()
+        self.source = source
+        self.loop = loop
+        self.video = None
+        self.paths = None
+        self.position = 0
+        self.frame = None
+        if os.path.isdir(source):
+            self.paths = sorted(
+                os.path.join(source, name)
+                for name in os.listdir(source)
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+            if not self.paths:
+                raise ValueError(f"No capture found in {source}")
+        else:
+            import cv2
+
+            self.video = cv2.VideoCapture(source)
+            if not self.video.isOpened():
+                raise ValueError(f"Cannot open video {source}")
+
+    def _current(self):
+        if self.frame is None:
+            self.frame = self._next_frame()
+        return self.frame
+
+    def _next_frame(self):
+        import cv2
+
+        if self.paths is not None:
+            if self.position == len(self.paths):
+                if not self.loop:
+                    raise EOFError(f"No more captures in {self.source}")
+                self.position = 0
+            self.position += 1
+            return cv2.imread(self.paths[self.position - 1])
+        ok, frame = self.video.read()
+        if not ok and self.loop:
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.video.read()
+        if not ok:
+            raise EOFError(f"No more frames in {self.source}")
+        return frame
+
+    def window_size(self):
+        height, width = self._current().shape[:2]
+        return width, height
+
+    def _grab(self, out, left, top):
+        height, width = out.shape[:2]
+        np.copyto(out, self._current()[top : top + height, left : left + width])
+
+    def capture_window(self, roi=None):
+        image = super().capture_window(roi)
+        # Every capture returns the next frame
+        self.frame = None
+        return image
+
+    def close(self):
+        if self.video is not None:
+            self.video.release()
+
+
+def open_capture(backend, target, activate=True):
+    """
+    :param backend: One of BACKENDS
+    :param target: Window title, or the captures directory or video of a replay
+    :param activate: Bring a Windows window to the foreground once found
+    """
+    if backend == "windows":
+        from window_extractor import WindowInformationExtractor
+
+        return WindowInformationExtractor(target, activate)
+    if backend == "x11":
+        return X11Capture(target)
+    if backend == "replay":
+        return ReplayCapture(target)
+    raise ValueError(f"Unknown capture backend: {backend}")
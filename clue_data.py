@@ -0,0 +1,104 @@
+import hashlib
+import json
+
+CHUNK_SIZE = 1 << 16
+
+_decoder = json.JSONDecoder()
+
+
+def file_digest(path):
+    """
+    :return: SHA-256 hex digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def map_digest(x, y, clues):
+    """
+    :return: Short digest identifying the position and clue set of a map
+    """
+    canonical = f"{x},{y}:{','.join(str(clue) for clue in sorted(set(clues)))}"
+    return hashlib.blake2b(canonical.encode(), digest_size=8).hexdigest()
+
+
+class _JSONStream:
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON document")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos}, got '{self.peek()}'")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # A scalar cut at the end of the buffer may decode to a truncated value
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def members(self):
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            separator = self.peek()
+            self.pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError(f"Expected ',' or '}}' at offset {self.pos - 1}")
+
+
+def iter_sections(path, streamed=("maps",)):
+    """
+    Stream the top-level members of a clue dump without loading it whole.
+
+    Sections listed in streamed must be objects and are yielded member by member
+    as (section, key, value). Other sections are decoded at once and yielded as
+    (section, None, value).
+    """
+    with open(path, encoding="utf-8") as f:
+        stream = _JSONStream(f)
+        for section in stream.members():
+            if section in streamed:
+                for key in stream.members():
+                    yield section, key, stream.value()
+            else:
+                yield section, None, stream.value()
@@ -0,0 +1,167 @@
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from api import API
+from models import Hint
+
+# Lines of tweaks_to_db look like "Gravue de dragodine - -23,13" or "Canard en plastique -13, 33"
+TWEAK_PATTERN = re.compile(r"^(?P<name>.+?)\s+(?:-\s+)?(?P<x>-?\d{1,3}),\s*(?P<y>-?\d{1,3})\s*$")
+
+
+class Corrections:
+    """
+    Append-only overlay of (clue, x, y, add/remove) records on top of the map data.
+
+    Records are JSON lines in a file that is only ever appended to, so reload() just
+    reads what was written since the previous call. Lookups merge the overlay with
+    the built index, which avoids rebuilding the database for each community fix.
+    """
+
+    def __init__(self, path="data/corrections.jsonl"):
+        self.logger = logging.getLogger("corrections")
+        self.path = path
+        self.added = {}
+        self.removed = {}
+        self.touched = set()
+        self.offset = 0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def _apply(self, record):
+        clue_id = record["clue_id"]
+        position = (int(record["x"]), int(record["y"]))
+        if record["action"] == "add":
+            self.added.setdefault(clue_id, set()).add(position)
+            self.removed.get(clue_id, set()).discard(position)
+        else:
+            self.removed.setdefault(clue_id, set()).add(position)
+            self.added.get(clue_id, set()).discard(position)
+        self.touched.add(clue_id)
+
+    def reload(self):
+        """
+        Apply the records appended to the file since the last call.
+        """
+        with self._lock:
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                return
+            if size < self.offset:
+                # The file was replaced rather than appended to
+                self.added, self.removed, self.touched = {}, {}, set()
+                self.offset = 0
+            if size == self.offset:
+                return
+
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read()
+            # Leave a partially written last line for the next reload
+            end = data.rfind(b"\n") + 1
+            count = 0
+            for line in data[:end].splitlines():
+                if line.strip():
+                    self._apply(json.loads(line))
+                    count += 1
+            self.offset += end
+            self.logger.info(f"Loaded {count} corrections from {self.path}")
+
+    def record(self, clue_id, x, y, action, source="manual"):
+        if action not in ("add", "remove"):
+            raise ValueError(f"Unknown correction action: {action}")
+        record = {
+            "clue_id": clue_id,
+            "x": int(x),
+            "y": int(y),
+            "action": action,
+            "source": source,
+            "at": time.time(),
+        }
+        self.reload()
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+                self.offset = f.tell()
+            self._apply(record)
+        self.logger.info(f"Recorded correction {record}")
+
+    def add(self, clue_id, x, y, source="manual"):
+        if (int(x), int(y)) not in self.added.get(clue_id, ()):
+            self.record(clue_id, x, y, "add", source)
+
+    def remove(self, clue_id, x, y, source="manual"):
+        if (int(x), int(y)) not in self.removed.get(clue_id, ()):
+            self.record(clue_id, x, y, "remove", source)
+
+    def has(self, clue_id, position, base_positions):
+        """
+        :return: Whether the clue is at position once the overlay is applied
+        """
+        if position in self.added.get(clue_id, ()):
+            return True
+        return position in base_positions and position not in self.removed.get(clue_id, ())
+
+    def import_tweaks(self, path, index):
+        """
+        Add the hand-collected "name - x,y" lines of a tweaks file.
+
+        :param index: HintIndex used to resolve the clue names
+        :return: Number of lines imported
+        """
+        imported = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                match = TWEAK_PATTERN.match(line.strip())
+                if not match:
+                    continue
+                candidates = index.resolve(Hint(match["name"]).sanitize().text)
+                if not candidates:
+                    self.logger.warning(f"No clue matches tweak line '{line.strip()}'")
+                    continue
+                self.add(candidates[0][0], match["x"], match["y"], source=os.path.basename(path))
+                imported += 1
+        return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Edit the map corrections overlay")
+    parser.add_argument("--path", default="data/corrections.jsonl", help="Corrections file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Import a tweaks_to_db style file")
+    import_parser.add_argument("tweaks", nargs="?", default="tweaks_to_db")
+    for action in ("add", "remove"):
+        action_parser = subparsers.add_parser(action, help=f"{action.capitalize()} a clue")
+        action_parser.add_argument("hint", help="Clue name")
+        action_parser.add_argument("x", type=int)
+        action_parser.add_argument("y", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+
+    api = API()
+    api.build_db()
+    index = api.get_index()
+    corrections = Corrections(args.path)
+    if args.command == "import":
+        print(f"Imported {corrections.import_tweaks(args.tweaks, index)} corrections")
+        return
+
+    candidates = index.resolve(Hint(args.hint).sanitize().text)
+    if not candidates:
+        raise SystemExit(f"No clue matches '{args.hint}'")
+    clue_id = candidates[0][0]
+    getattr(corrections, args.command)(clue_id, args.x, args.y)
+    print(f"{args.command} {index.clue_names[clue_id]} at {args.x},{args.y}")
+
+
+if __name__ == "__main__":
+    main()
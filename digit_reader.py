@@ -0,0 +1,228 @@
+import logging
+import os
+import re
+import threading
+
+import cv2
+import numpy as np
+
+from models import Coordinates
+
+GLYPH_WIDTH = 10
+GLYPH_HEIGHT = 16
+# Templates kept per character, the oldest are replaced first
+MAX_TEMPLATES = 8
+# Correlation above which a glyph adds nothing to the templates of its character
+DUPLICATE_SCORE = 0.98
+CHARSET = "0123456789-,"
+
+COORDS_PATTERN = re.compile(r"^(-?\d{1,2}),(-?\d{1,2})$")
+
+
+def segment_glyphs(crop):
+    """
+    Split a coordinates crop into glyphs separated by empty columns.
+
+    Each glyph keeps the full height of the text line, so that the minus sign and the
+    comma stay distinguishable by their vertical position once normalized.
+
+    :return: List of float32 vectors of GLYPH_WIDTH * GLYPH_HEIGHT values
+    """
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # The text is the minority of the pixels, whatever the theme
+    if np.count_nonzero(binary) > binary.size / 2:
+        binary = cv2.bitwise_not(binary)
+
+    rows = np.flatnonzero(binary.any(axis=1))
+    if rows.size == 0:
+        return []
+    line = binary[rows[0] : rows[-1] + 1]
+
+    columns = line.any(axis=0).astype(np.int8)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], columns, [0]))))
+    glyphs = []
+    for start, stop in zip(edges[::2], edges[1::2]):
+        glyph = line[:, start:stop]
+        if np.count_nonzero(glyph) < 2:
+            continue
+        glyph = cv2.resize(glyph, (GLYPH_WIDTH, GLYPH_HEIGHT), interpolation=cv2.INTER_AREA)
+        glyphs.append(glyph.astype(np.float32).ravel())
+    return glyphs
+
+
+def _normalize(vectors):
+    vectors = vectors - vectors.mean(axis=-1, keepdims=True)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-6)
+
+
+class DigitReader:
+    """
+    Template matching reader for the coordinates widget.
+
+    Glyph templates are learned from confident easyocr reads of the same widget that
+    are verified, either by the position predicted by the hunt session or by the
+    same text being read on two frames in a row, so that a single confident misread
+    cannot teach a wrong glyph. They are persisted, so after a few presses the
+    coordinates are read without any neural network pass. Each glyph is matched by
+    normalized correlation against every template in a single matrix product.
+
+    A reader may be shared by threads, reads wait for a template update to finish.
+    """
+
+    def __init__(self, path="data/glyphs.npz", min_confidence=0.9, frozen=False):
+        """
+        :param path: File the templates are loaded from and saved to
+        :param min_confidence: Lowest per-character score of an accepted read
+        :param frozen: Only read with the loaded templates, never learn new ones
+        """
+        self.logger = logging.getLogger("digit_reader")
+        self.path = path
+        self.min_confidence = min_confidence
+        self.frozen = frozen
+        self.templates = {char: [] for char in CHARSET}
+        self.changed = False
+        self._matrix = None
+        self._labels = None
+        self._unverified = None
+        # Reentrant, as read_coordinates reads through read
+        self._lock = threading.RLock()
+        if os.path.exists(path):
+            with np.load(path) as data:
+                for char in CHARSET:
+                    key = f"glyph_{ord(char)}"
+                    if key in data:
+                        self.templates[char] = list(data[key])
+            self.logger.info(f"Loaded glyph templates for '{self.known_characters()}'")
+
+    def known_characters(self):
+        return "".join(char for char in CHARSET if self.templates[char])
+
+    @property
+    def ready(self):
+        # An unknown character would silently match the closest known one
+        return all(self.templates[char] for char in CHARSET)
+
+    def _compile(self):
+        labels = []
+        vectors = []
+        for char, templates in self.templates.items():
+            labels.extend(char * len(templates))
+            vectors.extend(templates)
+        self._labels = labels
+        self._matrix = _normalize(np.array(vectors, dtype=np.float32)) if vectors else None
+
+    def read(self, crop):
+        """
+        :return: Tuple of (text, per-character confidences), or (None, []) when the
+            crop has no glyph or no template is known yet
+        """
+        glyphs = segment_glyphs(crop)
+        with self._lock:
+            if self._matrix is None:
+                self._compile()
+            if self._matrix is None or not glyphs:
+                return None, []
+
+            scores = _normalize(np.array(glyphs)) @ self._matrix.T
+            best = scores.argmax(axis=1)
+            text = "".join(self._labels[i] for i in best)
+            confidences = scores[np.arange(len(glyphs)), best].tolist()
+            return text, confidences
+
+    def read_coordinates(self, crop):
+        """
+        :return: Coordinates if every character was matched confidently, else None
+        """
+        with self._lock:
+            if not self.ready:
+                return None
+            text, confidences = self.read(crop)
+            if text is None:
+                return None
+            match = COORDS_PATTERN.match(text)
+            if not match or min(confidences) < self.min_confidence:
+                self.logger.debug(f"Unconfident glyph read '{text}' {confidences}")
+                return None
+            self.logger.info(f"Coordinates read from glyphs: {text} (min {min(confidences):.2f})")
+            return Coordinates(x=int(match[1]), y=int(match[2]))
+
+    def matches(self, crop, text):
+        """
+        Check a crop against an expected text, which only needs the templates of its
+        characters, unlike read_coordinates.
+
+        :return: Whether the crop segments into one glyph per character of text, each
+            matching a template of its character confidently
+        """
+        glyphs = segment_glyphs(crop)
+        if len(glyphs) != len(text):
+            return False
+        with self._lock:
+            if not all(self.templates.get(char) for char in text):
+                return False
+            for char, glyph in zip(text, glyphs):
+                scores = _normalize(np.array(self.templates[char])) @ _normalize(glyph)
+                if scores.max() < self.min_confidence:
+                    return False
+            return True
+
+    def learn(self, crop, text, verified=False):
+        """
+        Store the glyphs of a crop whose text is known, when they segment into
+        exactly one glyph per character and differ from the known templates.
+
+        :param verified: Whether the text was checked against another source, an
+            unverified text is only learned once it has been read twice in a row
+        :return: Whether templates were added
+        """
+        with self._lock:
+            if self.frozen:
+                return False
+            text = text.replace(" ", "")
+            match = COORDS_PATTERN.match(text)
+            if not match or not Coordinates(x=int(match[1]), y=int(match[2])).are_valid():
+                return False
+            if not verified:
+                previous, self._unverified = self._unverified, text
+                if previous != text:
+                    self.logger.debug(f"Waiting for a second read of '{text}' before learning it")
+                    return False
+            glyphs = segment_glyphs(crop)
+            if len(glyphs) != len(text):
+                self.logger.debug(f"Cannot learn '{text}' from {len(glyphs)} glyphs")
+                return False
+
+            added = False
+            for char, glyph in zip(text, glyphs):
+                templates = self.templates[char]
+                if templates:
+                    scores = _normalize(np.array(templates)) @ _normalize(glyph)
+                    if scores.max() >= DUPLICATE_SCORE:
+                        continue
+                templates.append(glyph)
+                del templates[:-MAX_TEMPLATES]
+                added = True
+            if added:
+                self._matrix = None
+                self.changed = True
+            return added
+
+    def save(self):
+        """
+        Write the templates, if they changed since they were loaded or last saved.
+        """
+        with self._lock:
+            if not self.changed:
+                return
+            self.changed = False
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            np.savez_compressed(
+                self.path,
+                **{
+                    f"glyph_{ord(char)}": np.array(templates)
+                    for char, templates in self.templates.items()
+                    if templates
+                },
+            )
@@ -0,0 +1,120 @@
+import logging
+import threading
+
+from hint_matcher import SNAP_MARGIN
+from metrics import percentile
+
+logger = logging.getLogger("hint_cascade")
+
+TIERS = ("fast", "full")
+
+
+class HintCascade:
+    """
+    Settings and statistics of the two-tier hint read.
+
+    The fast tier reads a downscaled band of the hunt panel around the line where
+    "EN COURS" was found last time, the whole panel before any line is known. Its
+    result is accepted when the detection confidence and the clue name match score
+    both clear their bar, and the best clue name clearly beats the runner-up so that
+    a read shared by several names is not forced onto one of them. Otherwise the read escalates to the full resolution tier,
+    which runs the standalone settings over the whole panel.
+    """
+
+    def __init__(
+        self,
+        matcher,
+        min_confidence=0.5,
+        min_score=0.85,
+        scale=0.6,
+        band_lines=2,
+        margin=SNAP_MARGIN,
+    ):
+        """
+        :param matcher: HintMatcher scoring the fast tier hint against the clue names
+        :param min_confidence: Lowest easyocr confidence of an accepted fast read
+        :param min_score: Lowest clue name match score of an accepted fast read
+        :param scale: Factor the fast tier crop is resized by
+        :param band_lines: Lines read below the last "EN COURS" line, where the next
+            step is listed as the hunt goes on
+        :param margin: Lead over the runner-up clue name an accepted fast read needs
+        """
+        self.matcher = matcher
+        self.min_confidence = min_confidence
+        self.min_score = min_score
+        self.scale = scale
+        self.band_lines = band_lines
+        self.margin = margin
+        self.band = None
+        self.presses = {tier: 0 for tier in TIERS}
+        self.latencies = {tier: [] for tier in TIERS}
+        self._lock = threading.Lock()
+
+    def band_roi(self, panel_height):
+        """
+        :return: (y_min, y_max) rows of the hunt panel read by the fast tier
+        """
+        if self.band is None:
+            return 0, panel_height
+        y_min, y_max = self.band
+        line = y_max - y_min
+        return max(y_min - line, 0), min(y_max + line * self.band_lines, panel_height)
+
+    def remember(self, hint_box, panel_origin):
+        """
+        Keep the rows of the "EN COURS" line, from a hint box in image coordinates.
+        """
+        origin_y = panel_origin[1]
+        self.band = (
+            min(y for _, y in hint_box) - origin_y,
+            max(y for _, y in hint_box) - origin_y,
+        )
+
+    def accept(self, hint, confidence):
+        """
+        :return: Tuple of (clue_id, score) when the fast read clears both bars and
+            names a single clue, else None
+        """
+        if hint is None or confidence is None or confidence < self.min_confidence:
+            return None
+        ranked = self.matcher.rank(hint.sanitize().text)
+        if not ranked or ranked[0][1] < self.min_score:
+            return None
+        if len(ranked) > 1 and ranked[0][1] - ranked[1][1] < self.margin:
+            logger.debug(f"Fast read '{hint}' is ambiguous between {ranked[:2]}")
+            return None
+        return ranked[0]
+
+    def record(self, tier, seconds):
+        """
+        :param tier: Tier the hint was resolved at
+        :param seconds: Duration of the hint read, the rejected fast read included for
+            the full tier
+        """
+        with self._lock:
+            self.presses[tier] += 1
+            self.latencies[tier].append(seconds * 1000)
+
+    def stats(self):
+        with self._lock:
+            total = sum(self.presses.values())
+            return {
+                "presses": total,
+                "tiers": {
+                    tier: {
+                        "share": self.presses[tier] / total if total else None,
+                        "p50_ms": percentile(sorted(self.latencies[tier]), 50),
+                        "p95_ms": percentile(sorted(self.latencies[tier]), 95),
+                    }
+                    for tier in TIERS
+                },
+            }
+
+    def summary(self):
+        stats = self.stats()
+        parts = []
+        for tier, tier_stats in stats["tiers"].items():
+            if tier_stats["share"] is None or tier_stats["p50_ms"] is None:
+                continue
+            parts.append(f"{tier} {tier_stats['share']:.0%} (p50 {tier_stats['p50_ms']:.0f} ms)")
+        return f"Hint cascade: {stats['presses']} reads, {', '.join(parts) or 'none yet'}"
@@ -0,0 +1,185 @@
+import json
+import logging
+
+from hint_matcher import HintMatcher
+from models import Coordinates, normalize
+
+DIRECTIONS = ("RIGHT", "LEFT", "DOWN", "UP")
+STEPS = {"RIGHT": (1, 0), "LEFT": (-1, 0), "DOWN": (0, 1), "UP": (0, -1)}
+MAX_DISTANCE = 10
+
+# Distances written to the grid for a map, from the farthest to the nearest cell
+_RAY = bytes(range(MAX_DISTANCE, 0, -1))
+
+
+class HintIndex:
+    """
+    Precomputed "nearest map with this clue within 10 cells" lookup.
+
+    Every clue owns one bytearray holding, for each direction and each cell of the
+    world grid, the distance to the nearest map carrying the clue in that direction
+    (0 when there is none). Horizontal directions are stored row-major and vertical
+    ones column-major so that every map fills its ray with a single slice assignment.
+    """
+
+    def __init__(self, clue_names, positions):
+        """
+        :param clue_names: Mapping of clue id to its French name
+        :param positions: Iterable of (clue_id, x, y) rows
+        """
+        self.logger = logging.getLogger("hint_index")
+        self.clue_ids = {}
+        self.clue_names = {}
+        for clue_id, name in clue_names.items():
+            key = normalize(name)
+            self.clue_ids[key] = clue_id
+            self.clue_names[clue_id] = key
+
+        self.matcher = HintMatcher(clue_names)
+
+        by_clue = {}
+        for clue_id, x, y in positions:
+            by_clue.setdefault(clue_id, set()).add((int(x), int(y)))
+
+        all_positions = [p for clue_positions in by_clue.values() for p in clue_positions]
+        # Pad the grid so that positions just outside the known world still resolve
+        self.min_x = min((x for x, _ in all_positions), default=0) - MAX_DISTANCE
+        self.min_y = min((y for _, y in all_positions), default=0) - MAX_DISTANCE
+        self.width = max((x for x, _ in all_positions), default=0) + MAX_DISTANCE - self.min_x + 1
+        self.height = max((y for _, y in all_positions), default=0) + MAX_DISTANCE - self.min_y + 1
+        self.cells = self.width * self.height
+
+        self.positions = by_clue
+        self.corrections = None
+        self.grids = {
+            clue_id: self._build_grid(clue_positions) for clue_id, clue_positions in by_clue.items()
+        }
+        self.logger.info(
+            f"Hint index built: {len(self.grids)} clues over a {self.width}x{self.height} grid"
+        )
+
+    @classmethod
+    def from_connection(cls, conn):
+        # Clues without any known map are kept, the corrections overlay may add some
+        clue_names = dict(conn.execute("SELECT hint_id, name_fr FROM clues"))
+        positions = conn.execute("SELECT hint_id, x, y FROM clue_positions").fetchall()
+        return cls(clue_names, positions)
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, encoding="utf-8") as f:
+            hint_and_maps = json.load(f)
+        clue_names = {clue["clue-id"]: clue["name-fr"] for clue in hint_and_maps["clues"]}
+        positions = []
+        for details in hint_and_maps["maps"].values():
+            position = details.get("position", {})
+            x = position.get("x", 0)
+            y = position.get("y", 0)
+            positions.extend((clue_id, x, y) for clue_id in details.get("clues", []))
+        return cls(clue_names, positions)
+
+    def _build_grid(self, positions):
+        grid = bytearray(len(DIRECTIONS) * self.cells)
+        w, h = self.width, self.height
+        right, left, down, up = (i * self.cells for i in range(len(DIRECTIONS)))
+
+        # Writing the farthest maps first lets nearer maps overwrite their rays
+        for x, y in sorted(positions, key=lambda p: -p[0]):
+            row = right + (y - self.min_y) * w
+            start = x - self.min_x - MAX_DISTANCE
+            grid[row + max(start, 0) : row + start + MAX_DISTANCE] = _RAY[max(-start, 0) :]
+        for x, y in sorted(positions, key=lambda p: p[0]):
+            row = left + (y - self.min_y) * w
+            start = x - self.min_x + 1
+            stop = min(start + MAX_DISTANCE, w)
+            grid[row + start : row + stop] = _RAY[::-1][: stop - start]
+        for x, y in sorted(positions, key=lambda p: -p[1]):
+            col = down + (x - self.min_x) * h
+            start = y - self.min_y - MAX_DISTANCE
+            grid[col + max(start, 0) : col + start + MAX_DISTANCE] = _RAY[max(-start, 0) :]
+        for x, y in sorted(positions, key=lambda p: p[1]):
+            col = up + (x - self.min_x) * h
+            start = y - self.min_y + 1
+            stop = min(start + MAX_DISTANCE, h)
+            grid[col + start : col + stop] = _RAY[::-1][: stop - start]
+        return grid
+
+    def distance(self, x, y, direction, clue_id):
+        """
+        :return: Number of cells to the nearest map with the clue, or 0 if out of range
+        """
+        if self.corrections is not None and clue_id in self.corrections.touched:
+            return self._corrected_distance(x, y, direction, clue_id)
+        grid = self.grids.get(clue_id)
+        dx = x - self.min_x
+        dy = y - self.min_y
+        if grid is None or not (0 <= dx < self.width and 0 <= dy < self.height):
+            return 0
+        if direction == "RIGHT":
+            return grid[dy * self.width + dx]
+        if direction == "LEFT":
+            return grid[self.cells + dy * self.width + dx]
+        if direction == "DOWN":
+            return grid[2 * self.cells + dx * self.height + dy]
+        if direction == "UP":
+            return grid[3 * self.cells + dx * self.height + dy]
+        return 0
+
+    def _corrected_distance(self, x, y, direction, clue_id):
+        step_x, step_y = STEPS.get(direction, (0, 0))
+        if not (step_x or step_y):
+            return 0
+        base_positions = self.positions.get(clue_id, ())
+        for distance in range(1, MAX_DISTANCE + 1):
+            position = (x + step_x * distance, y + step_y * distance)
+            if self.corrections.has(clue_id, position, base_positions):
+                return distance
+        return 0
+
+    def nearest(self, x, y, direction, clue_id):
+        distance = self.distance(x, y, direction, clue_id)
+        if not distance:
+            return None
+        step_x, step_y = STEPS[direction]
+        return Coordinates(x=x + step_x * distance, y=y + step_y * distance)
+
+    def resolve(self, text):
+        """
+        :param text: Sanitized hint text
+        :return: Candidate (clue_id, score) pairs, best first
+        """
+        clue_id = self.clue_ids.get(text)
+        if clue_id is not None:
+            return [(clue_id, 1.0)]
+        return self.matcher.rank(text)
+
+    def best_candidate(self, x, y, direction, candidates):
+        """
+        :return: Tuple of (clue_id, score, distance) for the best scored candidate
+            that has a map in range, the nearest one on equal scores, or None
+        """
+        best = None
+        for clue_id, score in candidates:
+            distance = self.distance(x, y, direction, clue_id)
+            if distance and (best is None or (score, -distance) > (best[1], -best[2])):
+                best = (clue_id, score, distance)
+        return best
+
+    def lookup(self, current_coords, direction, hint):
+        """
+        Find the target coordinates of a sanitized hint, falling back to the closest
+        clue names when the hint is not an exact clue name.
+        """
+        if self.corrections is not None:
+            self.corrections.reload()
+        x, y = current_coords.x, current_coords.y
+        clue_id = hint.clue_id if hint.clue_id is not None else self.clue_ids.get(hint.text)
+        if clue_id is not None:
+            return self.nearest(x, y, direction, clue_id)
+
+        self.logger.info(f"Hint {hint} not found, approximate match")
+        best = self.best_candidate(x, y, direction, self.matcher.rank(hint.text))
+        if best is None:
+            return None
+        self.logger.info(f"Matched {hint} to {self.clue_names[best[0]]} ({best[1]:.2f})")
+        return self.nearest(x, y, direction, best[0])
@@ -0,0 +1,142 @@
+import json
+import logging
+
+from models import normalize
+
+# Characters of the panel text that must stay recognizable besides the clue names
+PANEL_CHARACTERS = "EN COURS"
+
+# Below this length the trigram containment is too unspecific to be trusted
+MIN_PARTIAL_LENGTH = 4
+
+# Lead over the runner-up clue name a hint needs to be snapped to the best one
+SNAP_MARGIN = 0.1
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _pattern_masks(pattern):
+    masks = {}
+    for i, char in enumerate(pattern):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks
+
+
+def levenshtein(pattern, masks, text):
+    """
+    Bit-parallel edit distance (Myers/Hyyrö) between a pattern and a text.
+
+    :param masks: Output of _pattern_masks(pattern), precomputed once per pattern
+    """
+    if not pattern:
+        return len(text)
+    full = (1 << len(pattern)) - 1
+    last = 1 << (len(pattern) - 1)
+    positive, negative = full, 0
+    distance = len(pattern)
+    for char in text:
+        eq = masks.get(char, 0)
+        xv = eq | negative
+        xh = (((eq & positive) + positive) ^ positive) | eq
+        horizontal_positive = negative | (~(xh | positive) & full)
+        horizontal_negative = positive & xh
+        if horizontal_positive & last:
+            distance += 1
+        elif horizontal_negative & last:
+            distance -= 1
+        horizontal_positive = ((horizontal_positive << 1) | 1) & full
+        horizontal_negative = (horizontal_negative << 1) & full
+        positive = horizontal_negative | (~(xv | horizontal_positive) & full)
+        negative = horizontal_positive & xv
+    return distance
+
+
+class HintMatcher:
+    """
+    Approximate matching of OCR output against the clue vocabulary.
+
+    Candidates are gathered from a character trigram index built once, then
+    scored with a Levenshtein distance. A query that is a truncated part of
+    a clue name (OCR often misses a word) also scores through trigram containment.
+    """
+
+    def __init__(self, clue_names, min_score=0.6, max_candidates=8):
+        """
+        :param clue_names: Mapping of clue id to its French name
+        :param min_score: Scores below this are not considered a match
+        :param max_candidates: Number of trigram candidates scored with Levenshtein
+        """
+        self.logger = logging.getLogger("hint_matcher")
+        self.min_score = min_score
+        self.max_candidates = max_candidates
+        self.names = {}
+        self.exact = {}
+        self.trigrams = {}
+        self.masks = {}
+        self.postings = {}
+        characters = set(PANEL_CHARACTERS)
+        for clue_id, name in clue_names.items():
+            characters.update(name)
+            key = normalize(name)
+            normalized = key.lower()
+            self.names[clue_id] = key
+            self.exact[normalized] = clue_id
+            self.trigrams[clue_id] = _trigrams(normalized)
+            self.masks[clue_id] = _pattern_masks(normalized)
+            for trigram in self.trigrams[clue_id]:
+                self.postings.setdefault(trigram, []).append(clue_id)
+        # Every character the recognizer may need to output to spell a clue name
+        self.allowlist = "".join(sorted(characters))
+
+    @classmethod
+    def from_json(cls, path, **kwargs):
+        with open(path, encoding="utf-8") as f:
+            clues = json.load(f)["clues"]
+        return cls({clue["clue-id"]: clue["name-fr"] for clue in clues}, **kwargs)
+
+    def rank(self, text):
+        """
+        :param text: Sanitized hint text
+        :return: List of (clue_id, score) above min_score, best first
+        """
+        query = text.strip().lower()
+        if not query:
+            return []
+        clue_id = self.exact.get(query)
+        if clue_id is not None:
+            return [(clue_id, 1.0)]
+
+        query_trigrams = _trigrams(query)
+        shared = {}
+        for trigram in query_trigrams:
+            for clue_id in self.postings.get(trigram, ()):
+                shared[clue_id] = shared.get(clue_id, 0) + 1
+        candidates = sorted(shared.items(), key=lambda item: -item[1])[: self.max_candidates]
+
+        ranked = []
+        for clue_id, count in candidates:
+            name = self.names[clue_id].lower()
+            longest = max(len(query), len(name))
+            containment = count / len(query_trigrams)
+            partial_score = 0.9 * containment if len(query) >= MIN_PARTIAL_LENGTH else 0.0
+            distance = levenshtein(name, self.masks[clue_id], query)
+            edit_score = max(1 - distance / longest, 0.0)
+            score = max(edit_score, partial_score)
+            if score >= self.min_score:
+                ranked.append((clue_id, score, edit_score))
+
+        ranked.sort(key=lambda item: (-item[1], -item[2]))
+        return [(clue_id, score) for clue_id, score, _ in ranked]
+
+    def match(self, text):
+        """
+        :return: Tuple of (clue_id, score) for the best match, or None
+        """
+        ranked = self.rank(text)
+        if not ranked:
+            self.logger.warning(f"No clue matches '{text}'")
+            return None
+        return ranked[0]
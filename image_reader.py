@@ -1,32 +1,48 @@
 import logging
-import math
 import os
+import time
 
 import cv2
-import easyocr
-import numpy as np
 
-from models import Coordinates, Detection, Hint
+from arrow_classifier import classify_arrow
+from hint_matcher import SNAP_MARGIN
+from layout import Layout
+from metrics import span, timed
+from models import Coordinates, Detection, Hint, normalize
+from ocr_engine import get_engine
+
+# easyocr reads of the coordinates at least this confident teach the digit reader
+LEARN_CONFIDENCE = 0.9
 
 
 class ImageReader:
-    def __init__(self, image):
+    def __init__(
+        self, image, ocr_engine=None, layout=None, digit_reader=None, lexicon=None, cascade=None
+    ):
         self.image = image
         self.logger = logging.getLogger("image_reader")
         self.cropped_hunt_panel = None
         self.cropped_coords = None
         self.hint_box = None
-        self.reader = easyocr.Reader(["fr"], gpu=True)
+        self.hint_confidence = None
+        self.arrow_confidence = None
+        self.ocr_engine = ocr_engine or get_engine()
+        self.reader = self.ocr_engine.cached_reader()
+        height, width = image.shape[:2]
+        self.layout = layout or Layout.default(width, height)
+        self.digit_reader = digit_reader
+        self.lexicon = lexicon
+        self.cascade = cascade
         self._crop_window()
 
+    @timed("crop")
     def _crop_window(self):
-        height, width = self.image.shape[:2]
-
         # Crop hunt panel and current coordinates
-        crop_height = height // 2
-        crop_width = (width // 8) + 50
-        self.cropped_hunt_panel = self.image[0:crop_height, 0:crop_width]
-        self.cropped_coords = self.image[70:95, 0:90]
+        y_min, y_max, x_min, x_max = self.layout.hunt_panel
+        self.cropped_hunt_panel = self.image[y_min:y_max, x_min:x_max]
+        self.panel_origin = (x_min, y_min)
+        y_min, y_max, x_min, x_max = self.layout.coords
+        self.cropped_coords = self.image[y_min:y_max, x_min:x_max]
 
         if logging.getLogger().isEnabledFor(logging.DEBUG):
             debug_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "debug")
@@ -35,32 +51,257 @@ class ImageReader:
             cv2.imwrite(os.path.join(debug_dir, "cropped_coords.png"), self.cropped_coords)
 
     def get_coordinates(self) -> Coordinates:
-        easyocr_coords = self.reader.readtext(
-            self.cropped_coords,
-            contrast_ths=0.1,  # Lower this to detect more low-contrast characters
-            text_threshold=0.5,  # Lower to be more lenient with character detection
-            low_text=0.2,  # Lower to better detect small characters like minus signs
-            width_ths=1.2,  # Slightly increase to better group characters
-            add_margin=0.1,  # Add some margin around the text
-            paragraph=False,  # Ensure characters aren't incorrectly grouped
+        coords = self._read_glyphs()
+        if coords is not None:
+            return coords
+
+        with span("coords_ocr"):
+            easyocr_coords = self.reader.readtext(
+                self.cropped_coords,
+                contrast_ths=0.1,  # Lower this to detect more low-contrast characters
+                text_threshold=0.5,  # Lower to be more lenient with character detection
+                low_text=0.2,  # Lower to better detect small characters like minus signs
+                width_ths=1.2,  # Slightly increase to better group characters
+                add_margin=0.1,  # Add some margin around the text
+                paragraph=False,  # Ensure characters aren't incorrectly grouped
+            )
+
+        return self._parse_coordinates(easyocr_coords)
+
+    def get_hint(self) -> str:
+        if self.cascade is None:
+            return self._read_hint()
+        start = time.perf_counter()
+        hint = self._read_hint_fast()
+        if hint is not None:
+            self.cascade.record("fast", time.perf_counter() - start)
+            return hint
+        hint = self._read_hint()
+        self.cascade.record("full", time.perf_counter() - start)
+        return hint
+
+    def _read_hint(self):
+        with span("hint_ocr"):
+            easyocr_hints = self.reader.readtext(
+                self.cropped_hunt_panel,
+                contrast_ths=0.2,
+                text_threshold=0.6,
+                low_text=0.3,
+                width_ths=0.5,
+                **self._hint_decoding(),
+            )
+
+        return self._parse_hint(easyocr_hints)
+
+    def _hint_decoding(self):
+        """
+        Recognition settings of the hint panel. With a lexicon, the recognizer may only
+        output characters of the known clue names. Decoding stays greedy, the lexicon
+        snap corrects what a beam search would.
+        """
+        if self.lexicon is None:
+            return {}
+        return {"allowlist": self.lexicon.allowlist}
+
+    def _read_hint_fast(self):
+        """
+        First tier of the hint cascade: read a downscaled grayscale band of the hunt
+        panel around the last "EN COURS" line, restricted to the clue name characters.
+
+        :return: Hint snapped to its clue name, None when the read is not trusted
+        """
+        cascade = self.cascade
+        y_min, y_max = cascade.band_roi(self.cropped_hunt_panel.shape[0])
+        if y_max <= y_min:
+            return None
+        gray = cv2.cvtColor(self.cropped_hunt_panel[y_min:y_max], cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(
+            gray, None, fx=cascade.scale, fy=cascade.scale, interpolation=cv2.INTER_AREA
         )
+        with span("hint_fast"):
+            easyocr_hints = self.reader.readtext(
+                small,
+                contrast_ths=0.2,
+                text_threshold=0.6,
+                low_text=0.3,
+                width_ths=0.5,
+                allowlist=cascade.matcher.allowlist,
+            )
+        # Back to hunt panel coordinates
+        easyocr_hints = [
+            ([[x / cascade.scale, y / cascade.scale + y_min] for x, y in box], text, confidence)
+            for box, text, confidence in easyocr_hints
+        ]
+
+        hint = self._find_hint(easyocr_hints)
+        match = cascade.accept(hint, self.hint_confidence)
+        if match is None:
+            self.logger.debug(
+                f"Fast hint read '{hint}' (confidence: {self.hint_confidence}) escalated"
+            )
+            self.hint_box = None
+            self.hint_confidence = None
+            return None
+        clue_id, score = match
+        cascade.remember(self.hint_box, self.panel_origin)
+        name = cascade.matcher.names[clue_id]
+        self.logger.info(f"Fast hint read '{hint}' recognized as '{name}' ({score:.2f})")
+        return Hint(name, clue_id)
+
+    def read_panel(self, expected_coords=None):
+        """
+        Read the coordinates and the hint with a single text detection pass over the
+        hunt panel, which already contains the coordinates widget.
+
+        Boxes inside the coordinates ROI are merged into one coordinates box, the others are
+        hint candidates. Both sets then go through the recognizer concurrently, each
+        with the contrast threshold of its standalone read.
+
+        With a cascade, the hint is first read by its fast tier and the full pass
+        only runs when that read is not trusted.
+
+        :param expected_coords: Predicted position, only confirmed against the glyph
+            templates of its characters and read by OCR when it does not match
+        :return: Tuple of (Coordinates, Hint)
+        """
+        if self.cascade is None:
+            return self._read_panel(expected_coords)
+        start = time.perf_counter()
+        hint = self._read_hint_fast()
+        if hint is not None:
+            self.cascade.record("fast", time.perf_counter() - start)
+            return self._read_coordinates(expected_coords), hint
+        coords, hint = self._read_panel(expected_coords)
+        self.cascade.record("full", time.perf_counter() - start)
+        return coords, hint
+
+    def _read_coordinates(self, expected_coords=None):
+        coords = self._read_glyphs()
+        if coords is not None:
+            return coords
+        if expected_coords is not None and self._confirm_coordinates(expected_coords):
+            return expected_coords
+        return self.get_coordinates()
+
+    def _read_panel(self, expected_coords=None):
+        with span("detect"):
+            horizontal_list, free_list = self.reader.detect(
+                self.cropped_hunt_panel,
+                text_threshold=0.6,
+                low_text=0.3,
+                width_ths=0.5,
+            )
+        horizontal_list, free_list = horizontal_list[0], free_list[0]
+        coords_boxes, hint_boxes = self._split_boxes(horizontal_list)
+
+        gray = cv2.cvtColor(self.cropped_hunt_panel, cv2.COLOR_BGR2GRAY)
+        coords = self._read_glyphs()
+        coords_future = None
+        if coords is None:
+            coords_future = self.ocr_engine.recognition_pool.submit(
+                self._recognize_coordinates, gray, coords_boxes, expected_coords
+            )
+        with span("hint_ocr"):
+            easyocr_hints = self.reader.recognize(
+                gray,
+                hint_boxes,
+                free_list,
+                contrast_ths=0.2,
+                reformat=False,
+                **self._hint_decoding(),
+            )
+
+        if coords_future is not None:
+            coords = coords_future.result()
+        return coords, self._parse_hint(easyocr_hints)
+
+    def _recognize_coordinates(self, gray, coords_boxes, expected_coords=None):
+        if expected_coords is not None and self._confirm_coordinates(expected_coords):
+            return expected_coords
+        with span("coords_ocr"):
+            easyocr_coords = self.reader.recognize(
+                gray, coords_boxes, [], contrast_ths=0.1, reformat=False
+            )
+        return self._parse_coordinates(easyocr_coords, expected_coords)
+
+    def _confirm_coordinates(self, expected_coords):
+        """
+        :return: Whether the coordinates widget shows expected_coords, matched against
+            the glyph templates of its characters without any OCR pass
+        """
+        if self.digit_reader is None:
+            return False
+        with span("coords_confirm"):
+            confirmed = self.digit_reader.matches(
+                self.cropped_coords, f"{expected_coords.x},{expected_coords.y}"
+            )
+        self.logger.debug(f"Coordinates confirmed as {expected_coords}: {confirmed}")
+        return confirmed
+
+    def _split_boxes(self, horizontal_list):
+        # Coordinates ROI relative to the hunt panel crop
+        origin_x, origin_y = self.panel_origin
+        y_min, y_max, x_min, x_max = self.layout.coords
+        y_min, y_max = y_min - origin_y, y_max - origin_y
+        x_min, x_max = x_min - origin_x, x_max - origin_x
+        # The widget is always recognized over at least its whole ROI, so the detection
+        # thresholds of the hint, which may miss a lone minus sign, do not crop it out
+        coords_box = [x_min, x_max, y_min, y_max]
+        hint_boxes = []
+        for box in horizontal_list:
+            box_x_min, box_x_max, box_y_min, box_y_max = box
+            center_x = (box_x_min + box_x_max) / 2
+            center_y = (box_y_min + box_y_max) / 2
+            if x_min <= center_x < x_max and y_min <= center_y < y_max:
+                # Small glyphs like the minus sign are often split from the digits, so
+                # the widget is recognized as one box covering all of them
+                coords_box = [
+                    min(coords_box[0], box_x_min),
+                    max(coords_box[1], box_x_max),
+                    min(coords_box[2], box_y_min),
+                    max(coords_box[3], box_y_max),
+                ]
+            else:
+                hint_boxes.append(box)
 
+        return [coords_box], hint_boxes
+
+    def _read_glyphs(self):
+        if self.digit_reader is None:
+            return None
+        with span("coords_glyphs"):
+            return self.digit_reader.read_coordinates(self.cropped_coords)
+
+    def _parse_coordinates(self, easyocr_coords, expected_coords=None):
+        """
+        :param expected_coords: Predicted position, a read matching it is verified
+        """
         for detection in easyocr_coords:
             self.logger.debug(
                 f"Detected coordinates: '{detection[1]}' (confidence: {detection[2]:.2f})"
             )
 
-        return Coordinates(easyocr_coords)
-
-    def get_hint(self) -> str:
-        easyocr_hints = self.reader.readtext(
-            self.cropped_hunt_panel,
-            contrast_ths=0.2,
-            text_threshold=0.6,
-            low_text=0.3,
-            width_ths=0.5,
-        )
+        coords = Coordinates(easyocr_coords)
+        if (
+            self.digit_reader is not None
+            and coords.are_valid()
+            and easyocr_coords[0][2] >= LEARN_CONFIDENCE
+            and self.digit_reader.learn(
+                self.cropped_coords, f"{coords.x},{coords.y}", verified=coords == expected_coords
+            )
+        ):
+            self.digit_reader.save()
+        return coords
+
+    def _parse_hint(self, easyocr_hints):
+        hint = self._find_hint(easyocr_hints)
+        if hint is not None and self.cascade is not None:
+            self.cascade.remember(self.hint_box, self.panel_origin)
+        if hint is not None and self.lexicon is not None:
+            hint = self._snap_to_lexicon(hint)
+        return hint
 
+    def _find_hint(self, easyocr_hints):
         hint = None
         for i, ocr_result in enumerate(easyocr_hints):
             detection = Detection(ocr_result).sanitize()
@@ -68,20 +309,48 @@ class ImageReader:
 
             # We use the "EN COURS" tag to identify which text is a hint in the image
             if detection.text == "EN COURS":
+                # The tag follows the hint, a tag read first has nothing before it
+                if i == 0:
+                    continue
                 hint = Hint(easyocr_hints[i - 1][1])
-                self.hint_box = easyocr_hints[i - 1][0]
+                self.hint_box = self._to_image_box(easyocr_hints[i - 1][0])
+                self.hint_confidence = easyocr_hints[i - 1][2]
             elif "EN COURS" in detection.text:
                 # replace EN COURS in case it is included in the captured text
                 hint = Hint(detection.text.replace("EN COURS", ""))
-                self.hint_box = detection.box
-
+                self.hint_box = self._to_image_box(detection.box)
+                self.hint_confidence = detection.confidence
         return hint
 
-    def get_arrow_direction(self):
+    def _snap_to_lexicon(self, hint):
+        """
+        Replace the hint by its clue name when the best match clearly beats the
+        runner-up. An ambiguous hint is kept as read, so that the lookup ranks every
+        close clue name and picks one that has a map in range.
+        """
+        ranked = self.lexicon.rank(normalize(hint.text))
+        if not ranked:
+            return hint
+        clue_id, score = ranked[0]
+        if len(ranked) > 1 and score - ranked[1][1] < SNAP_MARGIN:
+            self.logger.info(f"Hint '{hint}' is ambiguous between {ranked[:2]}, not snapped")
+            return hint
+        name = self.lexicon.names[clue_id]
+        self.logger.info(f"Hint '{hint}' recognized as '{name}' ({score:.2f})")
+        return Hint(name, clue_id)
+
+    def _to_image_box(self, box):
+        origin_x, origin_y = self.panel_origin
+        return [[int(x) + origin_x, int(y) + origin_y] for x, y in box]
+
+    def get_arrow_crop(self):
         hint_top_left = self.hint_box[0]
         hint_bot_left = self.hint_box[3]
+        arrow_left, arrow_right = self.layout.arrow_column
+        if arrow_right is None:
+            arrow_right = hint_top_left[0]
         arrow_crop = self.image[
-            hint_top_left[1] - 20 : hint_bot_left[1] + 20, 10 : hint_top_left[0]
+            max(hint_top_left[1] - 20, 0) : hint_bot_left[1] + 20, arrow_left:arrow_right
         ]
 
         # Create debug directory if it doesn't exist
@@ -90,132 +359,9 @@ class ImageReader:
             os.makedirs(debug_dir, exist_ok=True)
             cv2.imwrite(os.path.join(debug_dir, "arrow_crop.png"), arrow_crop)
 
-        # The part below was fully written by Claude Sonnet 3.7
-        # Convert the image to grayscale
-        gray = cv2.cvtColor(arrow_crop, cv2.COLOR_BGR2GRAY)
-
-        # Apply Canny edge detector
-        edges = cv2.Canny(gray, 50, 150)
-
-        # Find contours in the image
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return arrow_crop
 
-        # Find the largest contour (assuming it's the arrow)
-        if not contours:
-            self.logger.warning("No contours found in arrow detection")
-            return None
-
-        arrow_contour = max(contours, key=cv2.contourArea)
-
-        # Get the minimum area rectangle that bounds the arrow
-        rect = cv2.minAreaRect(arrow_contour)
-        box = cv2.boxPoints(rect)
-        box = np.intp(box)
-
-        # Get the moments of the contour to find the centroid
-        M = cv2.moments(arrow_contour)
-        if M["m00"] == 0:
-            self.logger.warning("Could not compute moments for arrow contour")
-            return None
-
-        cx = int(M["m10"] / M["m00"])
-        cy = int(M["m01"] / M["m00"])
-
-        # Analyze the contour to detect the arrow head
-        # We'll use the distance from centroid to contour points
-        # The farthest point is likely to be one of the arrow extremities
-        max_dist = 0
-        farthest_point = None
-
-        for point in arrow_contour:
-            point = point[0]
-            dist = math.sqrt((point[0] - cx) ** 2 + (point[1] - cy) ** 2)
-            if dist > max_dist:
-                max_dist = dist
-                farthest_point = point
-
-        # Find another key point - the second farthest point from the centroid
-        # that is far from the first farthest point
-        min_distance_between_extremities = max_dist * 0.7  # Threshold
-        second_max_dist = 0
-        second_farthest_point = None
-
-        for point in arrow_contour:
-            point = point[0]
-            dist_to_centroid = math.sqrt((point[0] - cx) ** 2 + (point[1] - cy) ** 2)
-            if farthest_point is not None:
-                dist_to_farthest = math.sqrt(
-                    (point[0] - farthest_point[0]) ** 2 + (point[1] - farthest_point[1]) ** 2
-                )
-                if (
-                    dist_to_centroid > second_max_dist
-                    and dist_to_farthest > min_distance_between_extremities
-                ):
-                    second_max_dist = dist_to_centroid
-                    second_farthest_point = point
-
-        # Determine which point is the arrow head
-        # This is a simplified approach - the arrow head is likely the point
-        # that has fewer neighbors around it in the contour
-        arrow_head = None
-        arrow_tail = None
-
-        if farthest_point is not None and second_farthest_point is not None:
-            # Calculate the approximate area near both extremity points
-            radius = max_dist * 0.2  # Define a radius for neighborhood
-            head_neighbors = 0
-            tail_neighbors = 0
-
-            for point in arrow_contour:
-                point = point[0]
-                dist_to_farthest = math.sqrt(
-                    (point[0] - farthest_point[0]) ** 2 + (point[1] - farthest_point[1]) ** 2
-                )
-                dist_to_second = math.sqrt(
-                    (point[0] - second_farthest_point[0]) ** 2
-                    + (point[1] - second_farthest_point[1]) ** 2
-                )
-
-                if dist_to_farthest < radius:
-                    head_neighbors += 1
-                if dist_to_second < radius:
-                    tail_neighbors += 1
-
-            # The arrow head typically has fewer neighbors (more pointed)
-            if head_neighbors < tail_neighbors:
-                arrow_head = farthest_point
-                arrow_tail = second_farthest_point
-            else:
-                arrow_head = second_farthest_point
-                arrow_tail = farthest_point
-
-        # Draw arrow direction
-        if arrow_head is not None and arrow_tail is not None:
-            # Calculate the direction
-            dx = arrow_head[0] - arrow_tail[0]
-            dy = arrow_head[1] - arrow_tail[1]
-
-            # Calculate angle in degrees
-            angle = math.atan2(dy, dx) * 180 / math.pi
-
-            # Determine the cardinal direction
-            if -45 <= angle < 45:
-                direction = "RIGHT"
-                self.logger.info("Arrow direction identified: RIGHT")
-            elif 45 <= angle < 135:
-                direction = "DOWN"
-                self.logger.info("Arrow direction identified: DOWN")
-            elif -135 <= angle < -45:
-                direction = "UP"
-                self.logger.info("Arrow direction identified: UP")
-            else:
-                direction = "LEFT"
-                self.logger.info("Arrow direction identified: LEFT")
-
-        # Save or display the results
-
-        if arrow_head is not None and arrow_tail is not None:
-            return direction
-        else:
-            self.logger.warning("Could not determine arrow direction")
-            return None
+    @timed("arrow")
+    def get_arrow_direction(self):
+        direction, self.arrow_confidence = classify_arrow(self.get_arrow_crop())
+        return direction
@@ -0,0 +1,176 @@
+import json
+import logging
+import os
+import re
+
+from models import Detection
+
+logger = logging.getLogger("layout")
+
+# Position of the current coordinates widget in the default layout
+DEFAULT_COORDS_ROI = (70, 95, 0, 90)
+# Left edge of the arrow column, before it the panel border is drawn
+ARROW_COLUMN_LEFT = 10
+ROI_MARGIN = 8
+# Slack around the default hunt panel, where calibrated crops may overflow it
+CAPTURE_MARGIN = 32
+
+COORDS_PATTERN = re.compile(r"-?\d{1,2},-?\d{1,2}")
+
+
+class Layout:
+    """
+    Regions of interest of a game window, each as (y_min, y_max, x_min, x_max).
+
+    :param coords: Current coordinates widget
+    :param hunt_panel: Treasure hunt step list, containing the coordinates widget
+    :param arrow_column: (x_min, x_max) of the direction arrows, x_max being None when
+        it has to be taken from the left edge of the hint text
+    """
+
+    def __init__(self, width, height, coords, hunt_panel, arrow_column, calibrated=False):
+        self.width = width
+        self.height = height
+        self.coords = tuple(coords)
+        self.hunt_panel = tuple(hunt_panel)
+        self.arrow_column = tuple(arrow_column)
+        self.calibrated = calibrated
+
+    @classmethod
+    def default(cls, width, height):
+        """
+        Heuristic layout used until the window size has been calibrated.
+        """
+        return cls(
+            width,
+            height,
+            coords=DEFAULT_COORDS_ROI,
+            hunt_panel=(0, height // 2, 0, (width // 8) + 50),
+            arrow_column=(ARROW_COLUMN_LEFT, None),
+        )
+
+    @property
+    def key(self):
+        return f"{self.width}x{self.height}"
+
+    def to_dict(self):
+        return {
+            "coords": list(self.coords),
+            "hunt_panel": list(self.hunt_panel),
+            "arrow_column": list(self.arrow_column),
+        }
+
+    @classmethod
+    def from_dict(cls, width, height, data):
+        return cls(
+            width,
+            height,
+            coords=data["coords"],
+            hunt_panel=data["hunt_panel"],
+            arrow_column=data["arrow_column"],
+            calibrated=True,
+        )
+
+    def __repr__(self):
+        return f"Layout({self.key}, {self.to_dict()})"
+
+
+def capture_roi(width, height):
+    """
+    :return: Region of a window holding every crop taken by its layouts, the only
+        part of the window that needs to be captured
+    """
+    y_min, y_max, x_min, x_max = Layout.default(width, height).hunt_panel
+    return y_min, y_max + CAPTURE_MARGIN, x_min, x_max + CAPTURE_MARGIN
+
+
+class LayoutCache:
+    """
+    Calibrated layouts persisted to a JSON file, keyed by window size.
+    """
+
+    def __init__(self, path="data/layouts.json"):
+        self.path = path
+        self.layouts = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.layouts = json.load(f)
+
+    def get(self, width, height):
+        data = self.layouts.get(f"{width}x{height}")
+        if data is None:
+            return None
+        return Layout.from_dict(width, height, data)
+
+    def save(self, layout):
+        self.layouts[layout.key] = layout.to_dict()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.layouts, f, indent=4)
+        logger.info(f"Saved calibrated layout {layout}")
+
+    def layout_for(self, image, ocr_engine):
+        """
+        :return: The calibrated layout for the size of image, calibrating it on image
+            the first time, or the default layout if calibration fails
+        """
+        height, width = image.shape[:2]
+        layout = self.get(width, height)
+        if layout is None:
+            layout = calibrate(image, ocr_engine)
+            if layout.calibrated:
+                self.save(layout)
+        return layout
+
+
+def calibrate(image, ocr_engine):
+    """
+    Locate the coordinates widget, the hunt panel and the arrow column with one full
+    OCR pass over the default hunt panel crop.
+
+    :return: Calibrated Layout, or the default one if the panel could not be found
+    """
+    height, width = image.shape[:2]
+    default = Layout.default(width, height)
+    y_min, y_max, x_min, x_max = default.hunt_panel
+    results = ocr_engine.readtext(
+        image[y_min:y_max, x_min:x_max],
+        contrast_ths=0.2,
+        text_threshold=0.5,
+        low_text=0.2,
+        width_ths=0.5,
+    )
+    detections = [Detection(result).sanitize() for result in results]
+
+    coords_box = None
+    hint_box = None
+    for i, detection in enumerate(detections):
+        coords_text = results[i][1].replace("~", "-").replace(" ", "")
+        if coords_box is None and COORDS_PATTERN.search(coords_text):
+            coords_box = detection.box
+        elif detection.text == "EN COURS":
+            # The tag follows the hint, a tag detected first has nothing before it
+            if i > 0:
+                hint_box = detections[i - 1].box
+        elif "EN COURS" in detection.text:
+            hint_box = detection.box
+
+    if coords_box is None or hint_box is None:
+        logger.warning(f"Could not calibrate layout for {width}x{height}, using the default")
+        return default
+
+    coords = (
+        max(int(min(p[1] for p in coords_box)) - ROI_MARGIN, 0),
+        int(max(p[1] for p in coords_box)) + ROI_MARGIN,
+        max(int(min(p[0] for p in coords_box)) - ROI_MARGIN, 0),
+        int(max(p[0] for p in coords_box)) + ROI_MARGIN,
+    )
+    # Step lines are listed below the coordinates and the list grows as the hunt goes
+    # on, so the panel keeps the default bottom edge but only the width of its text
+    panel_right = max(int(max(p[0] for p in d.box)) for d in detections) + ROI_MARGIN
+    hunt_panel = (coords[0], y_max, 0, min(max(panel_right, coords[3]), x_max))
+    arrow_column = (ARROW_COLUMN_LEFT, int(min(p[0] for p in hint_box)))
+
+    layout = Layout(width, height, coords, hunt_panel, arrow_column, calibrated=True)
+    logger.info(f"Calibrated {layout}")
+    return layout
@@ -1,6 +1,8 @@
 import argparse
+import functools
 import logging
 import os
+import threading
 import time
 import winsound
 from datetime import datetime
@@ -8,67 +10,368 @@ from datetime import datetime
 import keyboard
 import pyperclip
 
-from api import API
-from image_reader import ImageReader
-from window_extractor import WindowInformationExtractor
+# Everything pulling in cv2, torch or the win32 modules is imported by the warm-up thread
+from capture import BACKENDS
+from metrics import metrics, span
+from ocr_engine import QUANTIZE_MODES
+
+
+def setup_logging(level=logging.INFO):
+    """
+    Log to the console and to a new file of the log directory.
+
+    Not done at import time, as the worker process imports this module again.
+    """
+    log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "log")
+    os.makedirs(log_dir, exist_ok=True)
+
+    log_file = os.path.join(
+        log_dir, f"treasure_hunt_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+    )
+    logging.basicConfig(
+        level=level,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[logging.FileHandler(log_file), logging.StreamHandler()],
+    )
 
-# Setup logging for main application
-log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "log")
-os.makedirs(log_dir, exist_ok=True)
 
-log_file = os.path.join(log_dir, f"treasure_hunt_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler(log_file), logging.StreamHandler()],
-)
 logger = logging.getLogger("main")
 
 
-def process_image():
+def process_image(
+    api,
+    ocr_engine,
+    layouts,
+    digit_reader,
+    lexicon,
+    capture,
+    session=None,
+    cascade=None,
+    image=None,
+):
+    from image_reader import ImageReader
+    from layout import capture_roi
+
     try:
-        start = time.process_time()
-        window = WindowInformationExtractor("Ina")
-        image = window.capture_window()
+        start = time.perf_counter()
+        if image is None:
+            image = capture.capture_window(capture_roi)
 
-        image_reader = ImageReader(image)
-        current_coords = image_reader.get_coordinates()
-        hint = image_reader.get_hint()
+        layout = layouts.layout_for(image, ocr_engine)
+        image_reader = ImageReader(image, ocr_engine, layout, digit_reader, lexicon, cascade)
+        expected_coords = session.expected() if session is not None else None
+        current_coords, hint = image_reader.read_panel(expected_coords)
+        if hint is None:
+            raise ValueError("No hint found in the hunt panel")
         direction = image_reader.get_arrow_direction()
 
         logger.info(f"Current coordinates: {current_coords}, Hint: {hint}, Direction: {direction}")
+        if not current_coords.are_valid():
+            raise ValueError(f"Could not read the current coordinates: {current_coords}")
 
-        api = API()
         target_coords = api.get_hint_coordinates(current_coords, direction, hint.sanitize())
         logger.info(f"Target coordinates: {target_coords}")
+        if target_coords is None:
+            raise RuntimeError(f"No target found for hint {hint}")
+        if session is not None:
+            session.record(current_coords, direction, hint, target_coords)
 
         pyperclip.copy(f"/travel {target_coords.x} {target_coords.y}")
         winsound.PlaySound("assets/notif.wav", winsound.SND_FILENAME)
-        process_time = time.process_time() - start
-        logger.info(f"Processing completed in {process_time:.2f} seconds")
+        logger.info(f"Processing completed in {time.perf_counter() - start:.2f} seconds")
+        if ocr_engine.ocr_cache is not None:
+            logger.info(ocr_engine.ocr_cache.summary())
+        if cascade is not None:
+            logger.info(cascade.summary())
     except Exception as e:
         logger.error(f"An error occurred: {e}", exc_info=True)
         print(f"An error occurred: {e}")
 
 
+def request_service(url, window, image=None):
+    """
+    Have the solver service solve the window, the models staying loaded once in the
+    service however many clients run.
+
+    :param image: Window frame sent to the service, which captures the window itself
+        if None
+    """
+    from service import request_solve
+
+    try:
+        start = time.perf_counter()
+        result = request_solve(url, window, image)
+        logger.info(f"Service result: {result}")
+        if result["target"] is None:
+            raise RuntimeError(f"No target found for hint {result['hint']}")
+        pyperclip.copy(f"/travel {result['target'][0]} {result['target'][1]}")
+        winsound.PlaySound("assets/notif.wav", winsound.SND_FILENAME)
+        logger.info(f"Processing completed in {time.perf_counter() - start:.2f} seconds")
+    except Exception as e:
+        logger.error(f"An error occurred: {e}", exc_info=True)
+        print(f"An error occurred: {e}")
+
+
+class Solver:
+    """
+    Owner of everything a press needs: the lookup index, the OCR engine, the layout
+    cache, the digit reader, the lexicon and the hint cascade.
+
+    They are built on a background thread so that the hotkey listener is registered
+    right away. A press arriving before the warm-up is over waits for it instead of
+    loading the models a second time.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.ready = threading.Event()
+        self.error = None
+        self.api = None
+        self.ocr_engine = None
+        self.layouts = None
+        self.digit_reader = None
+        self.lexicon = None
+        self.capture = None
+        self.session = None
+        self.cascade = None
+
+    def start(self):
+        if self.args.metrics:
+            metrics.start(self.args.metrics, self.args.metrics_interval)
+        threading.Thread(target=self._warm_up, name="warm-up", daemon=True).start()
+
+    def _warm_up(self):
+        start = time.perf_counter()
+        try:
+            from api import API
+            from capture import open_capture
+            from corrections import Corrections
+            from digit_reader import DigitReader
+            from layout import LayoutCache
+            from ocr_cache import OCRCache
+            from ocr_engine import OCREngine
+
+            corrections = Corrections()
+            remote = None
+            if self.args.remote:
+                from treasure_hunt_api import TreasureHuntAPI
+
+                remote = TreasureHuntAPI(corrections=corrections)
+            self.api = API(corrections, remote)
+            self.api.build_db()
+            index = self.api.get_index()
+            logger.info(f"Lookup index ready after {time.perf_counter() - start:.2f} seconds")
+
+            ocr_cache = None
+            if self.args.ocr_cache != "off":
+                ocr_cache = OCRCache(
+                    path="data/ocr_cache.db" if self.args.ocr_cache == "disk" else None
+                )
+            self.ocr_engine = OCREngine(
+                gpu=self.args.gpu,
+                quantize=self.args.quantize,
+                threads=self.args.threads,
+                ocr_cache=ocr_cache,
+            )
+            self.ocr_engine.warm_up()
+            self.layouts = LayoutCache()
+            self.digit_reader = DigitReader()
+            self.lexicon = index.matcher if self.args.lexicon else None
+            self.capture = open_capture(self.args.capture, self.args.window)
+            if not self.args.no_session:
+                from session import HuntSession
+
+                self.session = HuntSession()
+            if self.args.cascade:
+                from hint_cascade import HintCascade
+
+                self.cascade = HintCascade(
+                    index.matcher,
+                    min_confidence=self.args.cascade_confidence,
+                    min_score=self.args.cascade_score,
+                    scale=self.args.cascade_scale,
+                )
+            logger.info(f"Solver warmed up in {time.perf_counter() - start:.2f} seconds")
+        except Exception as e:
+            self.error = e
+            logger.error(f"Warm-up failed: {e}", exc_info=True)
+        finally:
+            self.ready.set()
+
+    def wait(self):
+        if not self.ready.is_set():
+            logger.info("Waiting for the warm-up to finish")
+            self.ready.wait()
+        if self.error is not None:
+            raise RuntimeError("The solver failed to warm up") from self.error
+
+    def process_image(self, image=None):
+        # Errors are logged here like those of a solve, so that neither the watch loop
+        # nor the worker process dies when the warm-up failed
+        try:
+            self.wait()
+            with span("press"):
+                process_image(
+                    self.api,
+                    self.ocr_engine,
+                    self.layouts,
+                    self.digit_reader,
+                    self.lexicon,
+                    self.capture,
+                    self.session,
+                    self.cascade,
+                    image,
+                )
+        except Exception as e:
+            logger.error(f"An error occurred: {e}", exc_info=True)
+            print(f"An error occurred: {e}")
+
+
+def start_solver(args):
+    """
+    Worker process factory.
+
+    :return: Callable solving an image, or a new capture of the window when None
+    """
+    solver = Solver(args)
+    solver.start()
+    return solver.process_image
+
+
 def main():
+    start = time.perf_counter()
     parser = argparse.ArgumentParser()
     parser.add_argument("--debug", action="store_true")
     parser.add_argument("--debug_dir", default="debug_output", help="Directory for debug images")
+    parser.add_argument("--gpu", action="store_true", help="Run the OCR models on the GPU")
+    parser.add_argument(
+        "--capture",
+        choices=sorted(BACKENDS),
+        default="windows",
+        help="Capture backend of the game window",
+    )
+    parser.add_argument(
+        "--window",
+        default="Ina",
+        help="Title of the game window, or the captures directory or video to replay",
+    )
+    parser.add_argument(
+        "--quantize",
+        choices=QUANTIZE_MODES,
+        default="all",
+        help="Models run with dynamic int8 quantization on CPU",
+    )
+    parser.add_argument("--threads", type=int, help="Number of CPU threads used by torch")
+    parser.add_argument(
+        "--ocr_cache",
+        choices=("off", "memory", "disk"),
+        default="memory",
+        help="Reuse the OCR results of unchanged crops, across restarts with disk",
+    )
+    parser.add_argument(
+        "--warmup",
+        action="store_true",
+        help="With --in_process, wait for the models and the index before accepting hotkeys",
+    )
+    parser.add_argument(
+        "--watch", action="store_true", help="Solve automatically when the hunt panel changes"
+    )
+    parser.add_argument("--fps", type=float, default=2.0, help="Capture rate of the watch mode")
+    parser.add_argument(
+        "--lexicon",
+        action="store_true",
+        help="Constrain hint recognition to the known clue names",
+    )
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help="Read the hint on a downscaled band first, at full resolution only if unsure",
+    )
+    parser.add_argument(
+        "--cascade_confidence",
+        type=float,
+        default=0.5,
+        help="Lowest OCR confidence of a hint accepted by the fast tier",
+    )
+    parser.add_argument(
+        "--cascade_score",
+        type=float,
+        default=0.85,
+        help="Lowest clue name match score of a hint accepted by the fast tier",
+    )
+    parser.add_argument(
+        "--cascade_scale", type=float, default=0.6, help="Downscale factor of the fast tier"
+    )
+    parser.add_argument(
+        "--remote", action="store_true", help="Query the treasure hunt API on local misses"
+    )
+    parser.add_argument(
+        "--no_session",
+        action="store_true",
+        help="Read the coordinates on every press instead of confirming the predicted ones",
+    )
+    parser.add_argument(
+        "--metrics",
+        help="Dump the stage timings to this JSON file, or Prometheus text file if .prom",
+    )
+    parser.add_argument(
+        "--metrics_interval", type=float, default=30.0, help="Seconds between metrics dumps"
+    )
+    parser.add_argument(
+        "--service",
+        help="URL of a running solver service, such as http://127.0.0.1:8765, solving "
+        "presses instead of a local worker",
+    )
+    parser.add_argument(
+        "--in_process",
+        action="store_true",
+        help="Solve on the hotkey thread instead of a separate worker process",
+    )
     args = parser.parse_args()
 
-    log_level = logging.DEBUG if args.debug else logging.INFO
-    logging.basicConfig(level=log_level)
+    setup_logging(logging.DEBUG if args.debug else logging.INFO)
 
     logger.info("Starting treasure hunt solver application")
+    worker = None
+    if args.service:
+        solve = functools.partial(request_service, args.service, args.window)
+    elif args.in_process:
+        solver = Solver(args)
+        solver.start()
+        if args.warmup:
+            solver.ready.wait()
+        solve = solver.process_image
+    else:
+        from layout import capture_roi
+        from worker import SolverWorker
+
+        # The worker warms up on its own, presses made meanwhile wait in its queue.
+        # Submitted frames are cropped to the region the captures read
+        worker = SolverWorker(functools.partial(start_solver, args), roi=capture_roi)
+        worker.start()
+        solve = worker.submit
+
     print("Program running. Press Ctrl+D to process image, or Ctrl+C to exit.")
-    keyboard.add_hotkey("ctrl+d", lambda: process_image())
+    keyboard.add_hotkey("ctrl+d", solve)
+    logger.info(f"Hotkey listener ready in {time.perf_counter() - start:.2f} seconds")
 
     try:
+        if args.watch:
+            from capture import open_capture
+            from layout import LayoutCache
+            from watcher import PanelWatcher
+
+            watcher = PanelWatcher(
+                open_capture(args.capture, args.window), solve, LayoutCache(), fps=args.fps
+            )
+            watcher.start()
         keyboard.wait("ctrl+c")  # Keep the program running until Ctrl+C is pressed
     except KeyboardInterrupt:
         logger.info("Program terminated by user")
         print("\nProgram terminated.")
+    finally:
+        if worker is not None:
+            worker.stop()
 
 
 if __name__ == "__main__":
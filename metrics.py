@@ -0,0 +1,235 @@
+import atexit
+import functools
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger("metrics")
+
+# Upper bounds in seconds of the cumulative histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_NAME = "treasure_hunt_stage_seconds"
+
+
+def percentile(values, q):
+    """
+    :return: Nearest-rank percentile of a sorted list, None if it is empty
+    """
+    if not values:
+        return None
+    rank = max(math.ceil(q / 100 * len(values)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class Histogram:
+    """
+    Durations of one stage: cumulative bucket counts since startup, plus the latest
+    samples for the rolling percentiles.
+    """
+
+    def __init__(self, window=1024):
+        self.recent = deque(maxlen=window)
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.recent.append(seconds)
+            self.count += 1
+            self.sum += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    self.buckets[i] += 1
+                    break
+            else:
+                self.buckets[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self.recent)
+            buckets = list(self.buckets)
+            count, total = self.count, self.sum
+        return {
+            "count": count,
+            "sum": total,
+            "p50": percentile(recent, 50),
+            "p95": percentile(recent, 95),
+            "p99": percentile(recent, 99),
+            "max": recent[-1] if recent else None,
+            "buckets": buckets,
+        }
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    Wall-clock timings of the pipeline stages.
+
+    Disabled until start() is called, in which case span() hands out a shared no-op
+    context manager and nothing is recorded. Once started, the histograms can be
+    dumped periodically to a JSON file, or to a Prometheus text-format file when the
+    path ends with .prom.
+    """
+
+    def __init__(self, window=1024):
+        self.enabled = False
+        self.window = window
+        self.histograms = {}
+        self.path = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        return _Span(self, name) if self.enabled else _NULL_SPAN
+
+    def observe(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram(self.window))
+        histogram.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+
+    def snapshot(self):
+        with self._lock:
+            histograms = dict(self.histograms)
+        return {name: histogram.snapshot() for name, histogram in sorted(histograms.items())}
+
+    def to_json(self, snapshot):
+        return json.dumps(
+            {
+                "generated_at": time.time(),
+                "bucket_bounds": list(BUCKETS),
+                "stages": snapshot,
+            },
+            indent=2,
+        )
+
+    def to_prometheus(self, snapshot):
+        lines = [
+            f"# HELP {PROMETHEUS_NAME} Wall-clock duration of the solver stages",
+            f"# TYPE {PROMETHEUS_NAME} histogram",
+        ]
+        for name, stats in snapshot.items():
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), stats["buckets"]):
+                cumulative += count
+                labels = f'stage="{name}",le="{bound}"'
+                lines.append(f"{PROMETHEUS_NAME}_bucket{{{labels}}} {cumulative}")
+            lines.append(f'{PROMETHEUS_NAME}_sum{{stage="{name}"}} {stats["sum"]}')
+            lines.append(f'{PROMETHEUS_NAME}_count{{stage="{name}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path=None):
+        path = path or self.path
+        snapshot = self.snapshot()
+        text = self.to_prometheus(snapshot) if path.endswith(".prom") else self.to_json(snapshot)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Written aside then renamed, so that scrapers never read a partial file
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temporary, path)
+
+    def _dump_loop(self, interval):
+        while not self.stop_event.wait(interval):
+            try:
+                self.dump()
+            except OSError as e:
+                logger.error(f"Could not dump metrics to {self.path}: {e}")
+
+    def start(self, path=None, interval=30.0):
+        """
+        Enable recording.
+
+        :param path: File the histograms are dumped to every interval seconds and at
+            exit, none if None
+        """
+        self.enabled = True
+        self.path = path
+        if path and self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(
+                target=self._dump_loop, args=(interval,), name="metrics", daemon=True
+            )
+            self.thread.start()
+            atexit.register(self.stop)
+            logger.info(f"Dumping stage timings to {path} every {interval:.0f} seconds")
+
+    def stop(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+            self.dump()
+        self.enabled = False
+
+
+metrics = Metrics()
+
+
+def span(name):
+    """
+    Time the enclosed block under name, when metrics are enabled.
+    """
+    return metrics.span(name)
+
+
+def timed(name):
+    """
+    Decorator timing each call of the function under name, when metrics are enabled.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.observe(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
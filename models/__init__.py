@@ -1,5 +1,5 @@
 from .coordinates import Coordinates
 from .detection import Detection
-from .hint import Hint
+from .hint import Hint, normalize
 
-__all__ = ["Coordinates", "Detection", "Hint"]
+__all__ = ["Coordinates", "Detection", "Hint", "normalize"]
@@ -2,45 +2,61 @@ import logging
 import math
 import re
 
+logger = logging.getLogger("coordinates")
+
+COORDS_PATTERN = re.compile(r"(-?\d{1,2}),(-?\d{1,2})")
+# World coordinates have at most two digits
+MAX_COORDINATE = 99
+
 
 class Coordinates:
-    def __init__(self, ocr_result=None, x=None, y=None):
-        self.logger = logging.getLogger("coordinates")
-        self.x: int = x
-        self.y: int = y
-        if ocr_result:
-            self.coords_pair = self._sanitize(ocr_result)
-            self._split_coordinates()
+    """
+    Immutable (x, y) map position, with None coordinates when they could not be read.
+    """
 
-    def _split_coordinates(self):
-        pattern = r"(-?\d{1,2}),(-?\d{1,2})"
+    __slots__ = ("x", "y")
 
-        match = re.search(pattern, self.coords_pair)
+    def __init__(self, ocr_result=None, x=None, y=None):
+        if ocr_result:
+            x, y = self.parse(self._sanitize(ocr_result))
+        object.__setattr__(self, "x", None if x is None else int(x))
+        object.__setattr__(self, "y", None if y is None else int(y))
 
-        if match:
-            x, y = match.groups()
-            self.x = int(x)
-            self.y = int(y)
-            self.logger.info(f"Valid coordinates format: {self.x},{self.y}")
-            return True
-        else:
-            self.logger.warning(f"Invalid coordinates format: {self.coords_pair}")
-            return False
+    @staticmethod
+    def parse(text):
+        """
+        :return: Tuple of (x, y) ints read from text like "-12,34", (None, None) if
+            the text holds no coordinates
+        """
+        match = COORDS_PATTERN.search(text)
+        if match is None:
+            logger.warning(f"Invalid coordinates format: {text}")
+            return None, None
+        x, y = int(match[1]), int(match[2])
+        logger.info(f"Valid coordinates format: {x},{y}")
+        return x, y
 
     def are_valid(self):
-        pattern = r"^-?\d{1,2}$"
-        return re.match(pattern, self.x) and re.match(pattern, self.y)
+        return (
+            self.x is not None
+            and self.y is not None
+            and abs(self.x) <= MAX_COORDINATE
+            and abs(self.y) <= MAX_COORDINATE
+        )
 
     def get_coords(self):
         return self.x, self.y
 
     def get_distance(self, other):
-        return math.sqrt((self.x - int(other.x)) ** 2 + (self.y - int(other.y)) ** 2)
+        return math.hypot(self.x - other.x, self.y - other.y)
 
     @staticmethod
     def _sanitize(ocr_result):
         return ocr_result[0][1].replace("~", "-").replace(" ", "")
 
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
     def __str__(self):
         return f"({self.x}, {self.y})"
 
@@ -48,4 +64,9 @@ class Coordinates:
         return f"({self.x}, {self.y})"
 
     def __eq__(self, other):
+        if not isinstance(other, Coordinates):
+            return NotImplemented
         return self.x == other.x and self.y == other.y
+
+    def __hash__(self):
+        return hash((self.x, self.y))
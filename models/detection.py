@@ -1,17 +1,25 @@
-import logging
+class Detection:
+    """
+    Immutable easyocr result: box, text and confidence.
+    """
 
+    __slots__ = ("box", "confidence", "text")
 
-class Detection:
     def __init__(self, ocr_result):
-        self.text = ocr_result[1]
-        self.confidence = ocr_result[2]
-        self.box = ocr_result[0]
-        self.logger = logging.getLogger("detection")
+        object.__setattr__(self, "box", ocr_result[0])
+        object.__setattr__(self, "text", ocr_result[1])
+        object.__setattr__(self, "confidence", ocr_result[2])
 
     def sanitize(self):
+        """
+        :return: A Detection with the text cleaned from icon artifacts
+        """
         # The location icon often gets detected as a 0 or @
-        self.text = self.text.replace("0", "").replace("@", "").strip()
-        return self
+        text = self.text.replace("0", "").replace("@", "").strip()
+        return Detection((self.box, text, self.confidence))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
 
     def __str__(self):
         return f"{self.text} ({self.confidence:.2f})"
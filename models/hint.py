@@ -1,24 +1,49 @@
-import logging
+import functools
+import sys
 import unicodedata
 
 
+@functools.lru_cache(maxsize=4096)
+def normalize(text):
+    """
+    Sanitized form of a clue name, computed once per distinct text and interned so
+    that every index keyed by it shares the same string.
+    """
+    text = text.replace("œ", "oe").replace("'", "").strip()
+    text = "".join(c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn")
+    return sys.intern(text)
+
+
 class Hint:
-    def __init__(self, text):
-        self.text = text
-        self.logger = logging.getLogger("hint")
+    """
+    Immutable hint text, with the integer id of its clue once it is known.
+    """
+
+    __slots__ = ("clue_id", "text")
+
+    def __init__(self, text, clue_id=None):
+        object.__setattr__(self, "text", text)
+        object.__setattr__(self, "clue_id", clue_id)
 
     def sanitize(self):
-        self.text = self.text.replace("œ", "oe").replace("'", "").strip()
-        self.text = self._remove_accents(self.text)
-        return self
+        """
+        :return: A Hint with the text stripped of ligatures, apostrophes and accents
+        """
+        return Hint(normalize(self.text), self.clue_id)
 
-    def _remove_accents(self, text):
-        return "".join(
-            c for c in unicodedata.normalize("NFD", text) if unicodedata.category(c) != "Mn"
-        )
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
 
     def __str__(self):
         return f"{self.text}"
 
     def __repr__(self):
         return f"{self.text}"
+
+    def __eq__(self, other):
+        if not isinstance(other, Hint):
+            return NotImplemented
+        return self.text == other.text and self.clue_id == other.clue_id
+
+    def __hash__(self):
+        return hash((self.text, self.clue_id))
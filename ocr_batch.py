@@ -0,0 +1,231 @@
+import bisect
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger("ocr_batch")
+
+# Recognition settings the batched path understands, others go straight to the reader
+BATCHED_SETTINGS = frozenset(
+    (
+        "allowlist",
+        "blocklist",
+        "decoder",
+        "beamWidth",
+        "contrast_ths",
+        "adjust_contrast",
+        "filter_ths",
+        "workers",
+        "reformat",
+        "batch_size",
+    )
+)
+
+
+def recognize_boxes(
+    reader,
+    image,
+    horizontal_list,
+    free_list,
+    batch_size,
+    allowlist=None,
+    blocklist=None,
+    decoder="greedy",
+    beamWidth=5,
+    contrast_ths=0.1,
+    adjust_contrast=0.5,
+    filter_ths=0.003,
+    workers=0,
+    reformat=False,
+):
+    """
+    Recognize the boxes of a grayscale image in forward passes of batch_size crops.
+
+    easyocr's Reader.recognize runs the crops one at a time on CPU whatever its
+    batch_size, so the crops are built and run through the recognizer here the way
+    it does on GPU.
+
+    :return: List of (box, text, confidence), like Reader.recognize with
+        reformat=False
+    """
+    from easyocr.config import imgH
+    from easyocr.recognition import get_text
+    from easyocr.utils import get_image_list
+
+    if allowlist:
+        ignore_char = "".join(set(reader.character) - set(allowlist))
+    elif blocklist:
+        ignore_char = "".join(set(blocklist))
+    else:
+        ignore_char = "".join(set(reader.character) - set(reader.lang_char))
+    image_list, max_width = get_image_list(horizontal_list, free_list, image, model_height=imgH)
+    if not image_list:
+        return []
+    return get_text(
+        reader.character,
+        imgH,
+        int(max_width),
+        reader.recognizer,
+        reader.converter,
+        image_list,
+        ignore_char,
+        decoder,
+        beamWidth,
+        batch_size,
+        contrast_ths,
+        adjust_contrast,
+        filter_ths,
+        workers,
+        reader.device,
+    )
+
+
+class _Request:
+    __slots__ = ("free_list", "future", "horizontal_list", "image", "kwargs", "settings")
+
+    def __init__(self, image, horizontal_list, free_list, kwargs):
+        height, width = image.shape[:2]
+        if horizontal_list is None and free_list is None:
+            # easyocr recognizes the whole image when given no box
+            horizontal_list, free_list = [[0, width, 0, height]], []
+        self.image = image
+        self.horizontal_list = horizontal_list or []
+        self.free_list = free_list or []
+        self.kwargs = kwargs
+        self.settings = repr(sorted(kwargs.items()))
+        self.future = Future()
+
+
+class BatchedReader:
+    """
+    easyocr reader proxy running the recognitions of concurrent callers as one call.
+
+    Recognitions submitted within max_wait seconds of each other with the same
+    settings are stacked into a single grayscale image, their boxes shifted
+    accordingly, so that the recognizer sees all their crops in the same batches.
+    Results are split back by the image their box falls in. Every call runs the
+    recognizer directly over all its boxes in forward passes of up to max_batch_size
+    crops, as easyocr itself only batches on GPU. Only grayscale inputs passed with
+    reformat=False and settings among BATCHED_SETTINGS, as ImageReader does, are
+    batched; readtext, detect and any other recognition go straight to the reader.
+    """
+
+    def __init__(self, reader, max_wait=0.01, max_batch=16, max_batch_size=64):
+        """
+        :param max_wait: Seconds the first recognition of a batch waits for others
+        :param max_batch: Recognitions run together at most
+        :param max_batch_size: Boxes the recognizer runs in one forward pass at most
+        """
+        self.reader = reader
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.max_batch_size = max_batch_size
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.batched = 0
+        self.calls = 0
+        self.boxes = 0
+        self.seconds = 0.0
+        self.thread = threading.Thread(target=self._run, name="recognition-batch", daemon=True)
+        self.thread.start()
+
+    def readtext(self, image, **kwargs):
+        return self.reader.readtext(image, **kwargs)
+
+    def detect(self, image, **kwargs):
+        return self.reader.detect(image, **kwargs)
+
+    def recognize(self, image, horizontal_list=None, free_list=None, **kwargs):
+        if image.ndim != 2 or kwargs.get("reformat", True) or kwargs.keys() - BATCHED_SETTINGS:
+            return self.reader.recognize(image, horizontal_list, free_list, **kwargs)
+        # Set per call from the boxes of the whole batch
+        kwargs.pop("batch_size", None)
+        request = _Request(image, horizontal_list, free_list, kwargs)
+        self.requests.put(request)
+        return request.future.result()
+
+    def _run(self):
+        while True:
+            pending = [self.requests.get()]
+            try:
+                while len(pending) < self.max_batch:
+                    pending.append(self.requests.get(timeout=self.max_wait))
+            except queue.Empty:
+                pass
+            groups = {}
+            for request in pending:
+                groups.setdefault(request.settings, []).append(request)
+            for group in groups.values():
+                try:
+                    self._recognize(group)
+                except Exception as e:
+                    logger.exception("Batched recognition failed")
+                    for request in group:
+                        request.future.set_exception(e)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "recognitions": self.batched,
+            "calls": self.calls,
+            "boxes": self.boxes,
+            "boxes_per_call": self.boxes / self.calls if self.calls else None,
+            "boxes_per_second": self.boxes / self.seconds if self.seconds else None,
+        }
+
+    def _call(self, image, horizontal_list, free_list, kwargs):
+        boxes = len(horizontal_list) + len(free_list)
+        batch_size = max(min(boxes, self.max_batch_size), 1)
+        start = time.perf_counter()
+        results = recognize_boxes(
+            self.reader, image, horizontal_list, free_list, batch_size, **kwargs
+        )
+        self.seconds += time.perf_counter() - start
+        self.calls += 1
+        self.boxes += boxes
+        return results
+
+    def _recognize(self, group):
+        if len(group) == 1:
+            request = group[0]
+            request.future.set_result(
+                self._call(
+                    request.image, request.horizontal_list, request.free_list, request.kwargs
+                )
+            )
+            return
+
+        width = max(request.image.shape[1] for request in group)
+        offsets = []
+        height = 0
+        for request in group:
+            offsets.append(height)
+            height += request.image.shape[0]
+        stacked = np.zeros((height, width), dtype=group[0].image.dtype)
+        horizontal_list = []
+        free_list = []
+        for request, offset in zip(group, offsets):
+            image_height, image_width = request.image.shape
+            stacked[offset : offset + image_height, :image_width] = request.image
+            horizontal_list.extend(
+                [x_min, x_max, y_min + offset, y_max + offset]
+                for x_min, x_max, y_min, y_max in request.horizontal_list
+            )
+            free_list.extend([[x, y + offset] for x, y in box] for box in request.free_list)
+
+        results = self._call(stacked, horizontal_list, free_list, group[0].kwargs)
+        self.batches += 1
+        self.batched += len(group)
+        logger.debug(f"Recognized the boxes of {len(group)} crops in one call")
+
+        split = [[] for _ in group]
+        for box, text, confidence in results:
+            center_y = (min(y for _, y in box) + max(y for _, y in box)) / 2
+            i = max(bisect.bisect_right(offsets, center_y) - 1, 0)
+            split[i].append(([[x, y - offsets[i]] for x, y in box], text, confidence))
+        for request, request_results in zip(group, split):
+            request.future.set_result(request_results)
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger("ocr_cache")
+
+
+def _to_builtin(value):
+    # easyocr results mix numpy scalars and arrays with plain lists
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def crop_key(method, image, *args, **kwargs):
+    """
+    :return: Hex digest of the crop pixels and of the call settings
+    """
+    image = np.ascontiguousarray(image)
+    digest = hashlib.blake2b(digest_size=16)
+    # Boxes read back from the disk tier are plain lists, so settings are keyed as JSON
+    settings = json.dumps(
+        [method, image.shape, str(image.dtype), args, sorted(kwargs.items())],
+        default=_to_builtin,
+    )
+    digest.update(settings.encode())
+    digest.update(image.data)
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """
+    Results of OCR calls keyed by a hash of the crop they ran on.
+
+    Pressing the hotkey again on an unchanged screen yields pixel-identical crops, so
+    an exact hash of the pixels and of the call settings is enough to reuse the text,
+    boxes and confidences of the previous read. Entries live in an in-memory LRU and,
+    with a path, in an SQLite file that survives restarts, evicted least recently
+    used first once max_disk_entries is exceeded.
+    """
+
+    def __init__(self, max_entries=256, path=None, max_disk_entries=4096):
+        """
+        :param max_entries: Entries kept in memory
+        :param path: SQLite file of the disk tier, memory only if None
+        :param max_disk_entries: Entries kept on disk
+        """
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.entries = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+        self.conn = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    seconds REAL,
+                    used_at REAL,
+                    result TEXT
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS results_used_at ON results (used_at)")
+            self.conn.commit()
+
+    def get(self, key):
+        """
+        :return: The cached result, or None
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.memory_hits += 1
+                self.saved_seconds += entry[0]
+                return entry[1]
+            if self.conn is not None:
+                row = self.conn.execute(
+                    "SELECT seconds, result FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    with self.conn:
+                        self.conn.execute(
+                            "UPDATE results SET used_at = ? WHERE key = ?", (time.time(), key)
+                        )
+                    entry = (row[0], json.loads(row[1]))
+                    self._remember(key, entry)
+                    self.disk_hits += 1
+                    self.saved_seconds += entry[0]
+                    return entry[1]
+            self.misses += 1
+            return None
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def put(self, key, result, seconds):
+        """
+        :param seconds: Duration of the OCR call, counted as saved on each hit
+        """
+        with self._lock:
+            self._remember(key, (seconds, result))
+            if self.conn is None:
+                return
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                    (key, seconds, time.time(), json.dumps(result, default=_to_builtin)),
+                )
+                self.conn.execute(
+                    """
+                    DELETE FROM results WHERE key IN (
+                        SELECT key FROM results ORDER BY used_at DESC LIMIT -1 OFFSET ?
+                    )
+                    """,
+                    (self.max_disk_entries,),
+                )
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else None,
+            "saved_seconds": self.saved_seconds,
+        }
+
+    def summary(self):
+        stats = self.stats()
+        hit_rate = "n/a" if stats["hit_rate"] is None else f"{stats['hit_rate']:.0%}"
+        return (
+            f"OCR cache: {stats['hits']} hits ({stats['disk_hits']} from disk), "
+            f"{stats['misses']} misses, {hit_rate} hit rate, "
+            f"{stats['saved_seconds']:.2f} seconds of OCR saved"
+        )
+
+
+class CachedReader:
+    """
+    easyocr reader proxy answering readtext, detect and recognize from an OCRCache.
+    """
+
+    def __init__(self, reader, cache, namespace=""):
+        """
+        :param namespace: Prefix of the keys, distinguishing models whose results differ
+        """
+        self.reader = reader
+        self.cache = cache
+        self.namespace = namespace
+
+    def _call(self, method, image, *args, **kwargs):
+        key = crop_key(f"{self.namespace}{method}", image, *args, **kwargs)
+        result = self.cache.get(key)
+        if result is not None:
+            logger.debug(f"OCR cache hit for {method}")
+            return result
+        start = time.perf_counter()
+        result = getattr(self.reader, method)(image, *args, **kwargs)
+        self.cache.put(key, result, time.perf_counter() - start)
+        return result
+
+    def readtext(self, image, **kwargs):
+        return self._call("readtext", image, **kwargs)
+
+    def detect(self, image, **kwargs):
+        return self._call("detect", image, **kwargs)
+
+    def recognize(self, image, horizontal_list=None, free_list=None, **kwargs):
+        return self._call("recognize", image, horizontal_list, free_list, **kwargs)
@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+logger = logging.getLogger("ocr_engine")
+
+# Models converted to int8 by each quantization mode
+QUANTIZE_MODES = {
+    "none": (),
+    "recognizer": ("recognizer",),
+    "all": ("recognizer", "detector"),
+}
+
+
+class OCREngine:
+    """
+    Process-wide owner of the easyocr reader.
+
+    The detector and recognizer weights are loaded once, on first use or through an
+    explicit load(), and every ImageReader shares the same reader afterwards.
+    """
+
+    def __init__(
+        self,
+        languages=("fr",),
+        gpu=False,
+        quantize="all",
+        threads=None,
+        ocr_cache=None,
+        batch_wait=None,
+        recognition_workers=4,
+    ):
+        """
+        :param languages: Languages passed to easyocr
+        :param gpu: Run the models on the GPU instead of the CPU
+        :param quantize: One of QUANTIZE_MODES, the models to run with dynamic int8
+            quantization on CPU. "all" matches what easyocr does by default.
+        :param threads: Number of CPU threads used by torch, its default if None
+        :param ocr_cache: OCRCache answering the reads of unchanged crops, if any
+        :param batch_wait: Seconds concurrent recognitions wait for each other to run
+            as a single batch, each runs on its own if None
+        :param recognition_workers: Threads running coordinates recognitions next to
+            the hint ones, the number of panels read concurrently at full speed
+        """
+        if quantize not in QUANTIZE_MODES:
+            raise ValueError(f"Unknown quantization mode: {quantize}")
+        self.languages = list(languages)
+        self.gpu = gpu
+        self.quantize = quantize
+        self.threads = threads
+        self.ocr_cache = ocr_cache
+        self.batch_wait = batch_wait
+        self.reader = None
+        self.batched_reader = None
+        # Per engine, so that the windows of a service do not wait for each other
+        self.recognition_pool = ThreadPoolExecutor(
+            max_workers=recognition_workers, thread_name_prefix="recognition"
+        )
+        self._lock = threading.Lock()
+
+    def load(self):
+        # Imported here so that building an engine does not pull in torch
+        import easyocr
+
+        with self._lock:
+            if self.reader is None:
+                start = time.perf_counter()
+                if self.threads:
+                    import torch
+
+                    torch.set_num_threads(self.threads)
+                # Quantization is applied below so that the mode picks the models
+                reader = easyocr.Reader(self.languages, gpu=self.gpu, quantize=False)
+                if self.gpu and self.quantize != "none":
+                    logger.warning("Dynamic quantization only runs on CPU, skipping it")
+                elif not self.gpu:
+                    self._quantize(reader)
+                self.reader = reader
+                logger.info(
+                    f"OCR models loaded on {'GPU' if self.gpu else 'CPU'} "
+                    f"(quantize={self.quantize}) in {time.perf_counter() - start:.2f} seconds"
+                )
+        return self.reader
+
+    def _quantize(self, reader):
+        import torch
+
+        # The converted weights are deliberately not cached on disk. easyocr.Reader
+        # loads the float weights in any case, and an int8 state_dict can only be
+        # loaded into a module quantized from them, so the conversion would run
+        # either way. It only repacks the Linear and LSTM weights, its time is logged.
+        for name in QUANTIZE_MODES[self.quantize]:
+            start = time.perf_counter()
+            module = torch.quantization.quantize_dynamic(
+                getattr(reader, name), {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8
+            )
+            setattr(reader, name, module)
+            logger.info(f"Quantized {name} in {time.perf_counter() - start:.2f} seconds")
+
+    def warm_up(self):
+        """
+        Run one inference on a dummy crop so that the first real read does not pay
+        for lazy allocations in the models.
+        """
+        reader = self.load()
+        start = time.perf_counter()
+        dummy = np.full((40, 200, 3), 255, dtype=np.uint8)
+        dummy[15:25, 20:180] = 0
+        reader.readtext(dummy)
+        logger.info(f"OCR engine warmed up in {time.perf_counter() - start:.2f} seconds")
+
+    def cached_reader(self):
+        """
+        :return: The reader, behind the recognition batching and the OCR cache when
+            they are enabled
+        """
+        reader = self.load()
+        if self.batch_wait is not None:
+            with self._lock:
+                if self.batched_reader is None:
+                    from ocr_batch import BatchedReader
+
+                    self.batched_reader = BatchedReader(reader, max_wait=self.batch_wait)
+            reader = self.batched_reader
+        if self.ocr_cache is None:
+            return reader
+        from ocr_cache import CachedReader
+
+        namespace = f"{'_'.join(self.languages)}|{self.quantize}|{'gpu' if self.gpu else 'cpu'}|"
+        return CachedReader(reader, self.ocr_cache, namespace)
+
+    def readtext(self, image, **kwargs):
+        return self.load().readtext(image, **kwargs)
+
+
+_default_engine = None
+_default_lock = threading.Lock()
+
+
+def get_engine(gpu=False):
+    """
+    :return: The shared engine, created on first call with the given device
+    """
+    global _default_engine
+    with _default_lock:
+        if _default_engine is None:
+            _default_engine = OCREngine(gpu=gpu)
+        return _default_engine
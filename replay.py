@@ -0,0 +1,313 @@
+import argparse
+import json
+import logging
+import os
+import time
+
+import cv2
+
+from api import API
+from capture import IMAGE_EXTENSIONS
+from digit_reader import DigitReader
+from hint_cascade import HintCascade
+from image_reader import ImageReader
+from layout import LayoutCache
+from metrics import metrics, percentile
+from models import Hint
+from ocr_engine import QUANTIZE_MODES, OCREngine
+from session import HuntSession
+
+logger = logging.getLogger("replay")
+
+STAGES = ("crop", "read_panel", "arrow", "lookup")
+# Spans recorded inside read_panel, reported alongside the harness stages
+PANEL_STAGES = (
+    "coords_glyphs",
+    "coords_confirm",
+    "detect",
+    "coords_ocr",
+    "hint_fast",
+    "hint_ocr",
+)
+
+
+def load_captures(captures_dir):
+    """
+    Load the labelled captures of a replay directory.
+
+    The directory holds window screenshots and a labels.json mapping each file name
+    to its expected values, e.g.
+    {"step1.png": {"coords": [-23, 13], "hint": "Gravure de dragodinde",
+    "direction": "UP", "target": [-23, 9]}}. Unlabelled images are still replayed
+    for latency.
+
+    :return: List of (file name, labels) sorted by file name
+    """
+    labels_path = os.path.join(captures_dir, "labels.json")
+    labels = {}
+    if os.path.exists(labels_path):
+        with open(labels_path, encoding="utf-8") as f:
+            labels = json.load(f)
+
+    return [
+        (name, labels.get(name, {}))
+        for name in sorted(os.listdir(captures_dir))
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+
+
+class ReplayHarness:
+    """
+    Replay captures through the production path: a single read_panel call given the
+    position predicted by the session, then the arrow and the lookup.
+    """
+
+    def __init__(
+        self,
+        api,
+        ocr_engine,
+        layouts=None,
+        digit_reader=None,
+        lexicon=None,
+        cascade=None,
+        session=None,
+    ):
+        self.api = api
+        self.ocr_engine = ocr_engine
+        self.layouts = layouts
+        self.digit_reader = digit_reader
+        self.lexicon = lexicon
+        self.cascade = cascade
+        self.session = session
+        self.timings = {stage: [] for stage in STAGES}
+
+    def _timed(self, stage, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.timings[stage].append((time.perf_counter() - start) * 1000)
+
+    def replay(self, image, labels):
+        layout = self.layouts.layout_for(image, self.ocr_engine) if self.layouts else None
+        image_reader = self._timed(
+            "crop",
+            ImageReader,
+            image,
+            self.ocr_engine,
+            layout,
+            self.digit_reader,
+            self.lexicon,
+            self.cascade,
+        )
+        expected_coords = self.session.expected() if self.session is not None else None
+        coords, hint = self._timed("read_panel", image_reader.read_panel, expected_coords)
+        direction = None
+        target = None
+        if hint is not None:
+            direction = self._timed("arrow", image_reader.get_arrow_direction)
+            if coords.are_valid() and direction is not None:
+                target = self._timed(
+                    "lookup", self.api.get_hint_coordinates, coords, direction, hint.sanitize()
+                )
+                if self.session is not None:
+                    self.session.record(coords, direction, hint, target)
+
+        result = {
+            "coords": list(coords.get_coords()) if coords.x is not None else None,
+            "hint": hint.sanitize().text if hint is not None else None,
+            "direction": direction,
+            "arrow_confidence": image_reader.arrow_confidence,
+            "target": list(target.get_coords()) if target is not None else None,
+        }
+        checks = {}
+        if "coords" in labels:
+            checks["coords"] = result["coords"] == list(labels["coords"])
+        if "hint" in labels:
+            checks["hint"] = result["hint"] == Hint(labels["hint"]).sanitize().text
+        if "direction" in labels:
+            checks["direction"] = result["direction"] == labels["direction"]
+        if "target" in labels:
+            checks["target"] = result["target"] == list(labels["target"])
+        result["checks"] = checks
+        return result
+
+    def run(self, captures_dir):
+        # The inner stages of read_panel come from the metrics spans
+        metrics.start()
+        metrics.reset()
+        records = []
+        for name, labels in load_captures(captures_dir):
+            image = cv2.imread(os.path.join(captures_dir, name))
+            if image is None:
+                logger.warning(f"Could not read capture {name}")
+                continue
+            try:
+                record = self.replay(image, labels)
+            except Exception as e:
+                logger.error(f"Replay failed on {name}: {e}", exc_info=True)
+                record = {"error": str(e), "checks": {field: False for field in labels}}
+            record["capture"] = name
+            records.append(record)
+            logger.info(f"{name}: {record}")
+
+        return {"captures": len(records), **self.summary(records), "records": records}
+
+    def summary(self, records):
+        accuracy = {}
+        for field in ("coords", "hint", "direction", "target"):
+            checks = [r["checks"][field] for r in records if field in r["checks"]]
+            accuracy[field] = sum(checks) / len(checks) if checks else None
+
+        latency_ms = {}
+        for stage, values in self.timings.items():
+            ordered = sorted(values)
+            latency_ms[stage] = {
+                "count": len(ordered),
+                "p50": percentile(ordered, 50),
+                "p95": percentile(ordered, 95),
+                "p99": percentile(ordered, 99),
+            }
+        spans = metrics.snapshot()
+        for stage in PANEL_STAGES:
+            if stage in spans:
+                latency_ms[stage] = {"count": spans[stage]["count"]} | {
+                    q: spans[stage][q] * 1000 for q in ("p50", "p95", "p99")
+                }
+        summary = {"accuracy": accuracy, "latency_ms": latency_ms}
+        if self.cascade is not None:
+            summary["cascade"] = self.cascade.stats()
+        return summary
+
+
+def print_summary(result):
+    print(f"Replayed {result['captures']} captures")
+    for field, value in result["accuracy"].items():
+        print(f"  {field:<10} accuracy: {'n/a' if value is None else f'{value:.1%}'}")
+    print(f"  {'stage':<10} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, stats in result["latency_ms"].items():
+        values = ["-" if stats[q] is None else f"{stats[q]:.2f}" for q in ("p50", "p95", "p99")]
+        print(f"  {stage:<10} {stats['count']:>6} {values[0]:>9} {values[1]:>9} {values[2]:>9}")
+    if "cascade" in result:
+        print(f"  {'tier':<10} {'share':>6} {'p50 ms':>9} {'p95 ms':>9}")
+        for tier, stats in result["cascade"]["tiers"].items():
+            values = [
+                "-" if stats[key] is None else f"{stats[key]:.2f}" for key in ("p50_ms", "p95_ms")
+            ]
+            share = "n/a" if stats["share"] is None else f"{stats['share']:.0%}"
+            print(f"  {tier:<10} {share:>6} {values[0]:>9} {values[1]:>9}")
+
+
+def print_comparison(results):
+    print(
+        f"  {'mode':<12} {'load s':>7} {'coords':>7} {'hint':>7} {'panel p50':>10} {'hint p50':>9}"
+    )
+    for mode, result in results.items():
+        accuracy = result["accuracy"]
+        latency = result["latency_ms"]
+        cells = [
+            "n/a" if accuracy[field] is None else f"{accuracy[field]:.1%}"
+            for field in ("coords", "hint")
+        ] + [
+            "-" if latency.get(stage, {}).get("p50") is None else f"{latency[stage]['p50']:.2f}"
+            for stage in ("read_panel", "hint_ocr")
+        ]
+        print(
+            f"  {mode:<12} {result['load_seconds']:>7.2f} {cells[0]:>7} {cells[1]:>7} "
+            f"{cells[2]:>10} {cells[3]:>9}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay saved window captures offline")
+    parser.add_argument("captures_dir", help="Directory of captures and their labels.json")
+    parser.add_argument("--output", default="replay_results.json", help="Result file")
+    parser.add_argument("--gpu", action="store_true", help="Run the OCR models on the GPU")
+    parser.add_argument(
+        "--quantize",
+        default="all",
+        help=f"Comma separated quantization modes among {', '.join(QUANTIZE_MODES)}. "
+        "Several modes are replayed one after the other and compared",
+    )
+    parser.add_argument("--threads", type=int, help="Number of CPU threads used by torch")
+    parser.add_argument(
+        "--layouts", help="Layout cache file, captures use the default layout without it"
+    )
+    parser.add_argument("--glyphs", help="Glyph templates file enabling the digit reader")
+    parser.add_argument(
+        "--lexicon", action="store_true", help="Constrain hint recognition to the clue names"
+    )
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help="Read the hint on a downscaled band first, at full resolution only if unsure",
+    )
+    parser.add_argument(
+        "--cascade_confidence",
+        type=float,
+        default=0.5,
+        help="Lowest OCR confidence of a hint accepted by the fast tier",
+    )
+    parser.add_argument(
+        "--cascade_score",
+        type=float,
+        default=0.85,
+        help="Lowest clue name match score of a hint accepted by the fast tier",
+    )
+    parser.add_argument(
+        "--cascade_scale", type=float, default=0.6, help="Downscale factor of the fast tier"
+    )
+    parser.add_argument(
+        "--session",
+        action="store_true",
+        help="Replay the captures as the steps of one hunt, confirming predicted positions",
+    )
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    api = API()
+    api.build_db()
+    api.get_index()
+    layouts = LayoutCache(args.layouts) if args.layouts else None
+    lexicon = api.get_index().matcher if args.lexicon else None
+
+    results = {}
+    for mode in args.quantize.split(","):
+        start = time.perf_counter()
+        ocr_engine = OCREngine(gpu=args.gpu, quantize=mode, threads=args.threads)
+        ocr_engine.warm_up()
+        load_seconds = time.perf_counter() - start
+
+        cascade = None
+        if args.cascade:
+            cascade = HintCascade(
+                api.get_index().matcher,
+                min_confidence=args.cascade_confidence,
+                min_score=args.cascade_score,
+                scale=args.cascade_scale,
+            )
+        # Each mode reads with the same frozen templates, so that glyphs learned by a
+        # previous mode do not skew its latency and accuracy
+        digit_reader = DigitReader(args.glyphs, frozen=True) if args.glyphs else None
+        session = HuntSession(path=None) if args.session else None
+        harness = ReplayHarness(api, ocr_engine, layouts, digit_reader, lexicon, cascade, session)
+        results[mode] = {"load_seconds": load_seconds, **harness.run(args.captures_dir)}
+
+    result = next(iter(results.values())) if len(results) == 1 else {"modes": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    for mode, mode_result in results.items():
+        print(f"Mode {mode}:")
+        print_summary(mode_result)
+    if len(results) > 1:
+        print_comparison(results)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
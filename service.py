@@ -0,0 +1,372 @@
+import argparse
+import json
+import logging
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from capture import BACKENDS
+from metrics import Histogram, span
+from ocr_engine import QUANTIZE_MODES
+
+logger = logging.getLogger("service")
+
+DEFAULT_PORT = 8765
+
+
+class WindowState:
+    """
+    What the service keeps for one game window: its capture backend, its hunt session,
+    its hint cascade and the latency of its solves.
+    """
+
+    def __init__(self, name, capture_backend, session=True, cascade=None):
+        """
+        :param name: Window title, also naming the session file
+        :param capture_backend: One of capture.BACKENDS, used when a request carries
+            no image
+        :param session: Track the hunt of this window to confirm predicted positions
+        :param cascade: HintCascade of this window, if any
+        """
+        self.name = name
+        self.capture_backend = capture_backend
+        self.capture = None
+        self.session = None
+        if session:
+            from session import HuntSession
+
+            slug = re.sub(r"[^\w-]+", "_", name).strip("_") or "window"
+            self.session = HuntSession(path=f"data/sessions/{slug}.json")
+        self.cascade = cascade
+        self.latency = Histogram()
+        self.errors = 0
+        # Steps of a hunt are solved in order, one at a time per window
+        self.lock = threading.Lock()
+
+    def capture_window(self):
+        from capture import open_capture
+        from layout import capture_roi
+
+        if self.capture is None:
+            # Windows stay where they are, several of them cannot all be in the foreground
+            self.capture = open_capture(self.capture_backend, self.name, activate=False)
+        # A grab of a covered window would read the step of whatever covers it
+        if not self.capture.is_foreground():
+            raise RuntimeError(
+                f"Window '{self.name}' is not in the foreground, send its frame instead"
+            )
+        return self.capture.capture_window(capture_roi)
+
+    def stats(self):
+        latency = self.latency.snapshot()
+        stats = {
+            "solves": latency["count"],
+            "errors": self.errors,
+            "latency_ms": {
+                q: None if latency[q] is None else latency[q] * 1000
+                for q in ("p50", "p95", "p99", "max")
+            },
+        }
+        if self.session is not None:
+            stats["session"] = {
+                "steps": len(self.session.steps),
+                "confirmed": self.session.confirmed,
+                "mismatches": self.session.mismatches,
+            }
+        if self.cascade is not None:
+            stats["cascade"] = self.cascade.stats()
+        return stats
+
+
+class SolverService:
+    """
+    One OCR engine and one lookup index serving every game window.
+
+    Each request solves a step of one window, from the image it carries or from a
+    capture of the window taken by the service, which is refused unless the window
+    is in the foreground. Requests of different windows run concurrently and their
+    recognitions are batched through the shared recognizer, while each window keeps
+    its own session, hint cascade and latency statistics.
+    Memory does not grow with the number of clients beyond these small states.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.windows = {}
+        self.api = None
+        self.ocr_engine = None
+        self.layouts = None
+        self.digit_reader = None
+        self.lexicon = None
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        # Calibrating a new window size saves the layout file
+        self._layouts_lock = threading.Lock()
+
+    def load(self):
+        from api import API
+        from corrections import Corrections
+        from digit_reader import DigitReader
+        from layout import LayoutCache
+        from ocr_cache import OCRCache
+        from ocr_engine import OCREngine
+
+        start = time.perf_counter()
+        corrections = Corrections()
+        remote = None
+        if self.args.remote:
+            from treasure_hunt_api import TreasureHuntAPI
+
+            remote = TreasureHuntAPI(corrections=corrections)
+        self.api = API(corrections, remote)
+        self.api.build_db()
+        index = self.api.get_index()
+
+        ocr_cache = None
+        if self.args.ocr_cache != "off":
+            ocr_cache = OCRCache(
+                path="data/ocr_cache.db" if self.args.ocr_cache == "disk" else None
+            )
+        self.ocr_engine = OCREngine(
+            gpu=self.args.gpu,
+            quantize=self.args.quantize,
+            threads=self.args.threads,
+            ocr_cache=ocr_cache,
+            batch_wait=self.args.batch_wait / 1000,
+        )
+        self.ocr_engine.warm_up()
+        self.layouts = LayoutCache()
+        self.digit_reader = DigitReader()
+        self.lexicon = index.matcher if self.args.lexicon else None
+        logger.info(f"Solver service loaded in {time.perf_counter() - start:.2f} seconds")
+
+    def window(self, name):
+        with self._lock:
+            state = self.windows.get(name)
+            if state is None:
+                cascade = None
+                if self.args.cascade:
+                    from hint_cascade import HintCascade
+
+                    cascade = HintCascade(self.api.get_index().matcher)
+                state = WindowState(
+                    name, self.args.capture, session=not self.args.no_session, cascade=cascade
+                )
+                self.windows[name] = state
+                logger.info(f"Serving window '{name}'")
+            return state
+
+    def solve(self, name, image=None):
+        """
+        :param name: Window the step is solved for
+        :param image: Window frame as a BGR numpy array, captured by the service if None
+        :return: Dictionary of the step read and its solution
+        """
+        from image_reader import ImageReader
+
+        state = self.window(name)
+        with state.lock:
+            start = time.perf_counter()
+            try:
+                with span("press"):
+                    if image is None:
+                        image = state.capture_window()
+                    with self._layouts_lock:
+                        layout = self.layouts.layout_for(image, self.ocr_engine)
+                    image_reader = ImageReader(
+                        image,
+                        self.ocr_engine,
+                        layout,
+                        self.digit_reader,
+                        self.lexicon,
+                        state.cascade,
+                    )
+                    expected_coords = state.session.expected() if state.session else None
+                    current_coords, hint = image_reader.read_panel(expected_coords)
+                    direction = None
+                    target_coords = None
+                    if hint is not None:
+                        direction = image_reader.get_arrow_direction()
+                    if hint is not None and current_coords.are_valid() and direction:
+                        target_coords = self.api.get_hint_coordinates(
+                            current_coords, direction, hint.sanitize()
+                        )
+                        if state.session is not None:
+                            state.session.record(current_coords, direction, hint, target_coords)
+            except Exception:
+                state.errors += 1
+                raise
+            finally:
+                seconds = time.perf_counter() - start
+                state.latency.observe(seconds)
+
+        logger.info(
+            f"[{name}] Current coordinates: {current_coords}, Hint: {hint}, "
+            f"Direction: {direction}, Target: {target_coords} in {seconds:.2f} seconds"
+        )
+        return {
+            "window": name,
+            "coords": list(current_coords.get_coords()) if current_coords.x is not None else None,
+            "hint": hint.sanitize().text if hint is not None else None,
+            "direction": direction,
+            "target": list(target_coords.get_coords()) if target_coords is not None else None,
+            "seconds": seconds,
+        }
+
+    def stats(self):
+        with self._lock:
+            windows = dict(self.windows)
+        stats = {
+            "uptime_seconds": time.time() - self.started_at,
+            "windows": {name: state.stats() for name, state in sorted(windows.items())},
+        }
+        batched_reader = self.ocr_engine.batched_reader
+        if batched_reader is not None:
+            stats["recognition_batches"] = batched_reader.stats()
+        if self.ocr_engine.ocr_cache is not None:
+            stats["ocr_cache"] = self.ocr_engine.ocr_cache.stats()
+        return stats
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._reply(200, self.service.stats())
+        else:
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        prefix = "/solve/"
+        if not self.path.startswith(prefix):
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        name = urllib.parse.unquote(self.path[len(prefix) :])
+        length = int(self.headers.get("Content-Length") or 0)
+        image = None
+        if length:
+            data = np.frombuffer(self.rfile.read(length), dtype=np.uint8)
+            image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+            if image is None:
+                self._reply(400, {"error": "The request body is not an image"})
+                return
+        try:
+            self._reply(200, self.service.solve(name, image))
+        except Exception as e:
+            logger.error(f"Solve of '{name}' failed: {e}", exc_info=True)
+            self._reply(500, {"window": name, "error": str(e)})
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def request_solve(url, window, image=None, timeout=30.0):
+    """
+    Ask a running service to solve the current step of a window.
+
+    :param url: Base URL of the service, such as http://127.0.0.1:8765
+    :param image: Window frame as a BGR numpy array, captured by the service if None
+    :return: Dictionary returned by SolverService.solve
+    """
+    body = b""
+    if image is not None:
+        body = cv2.imencode(".png", image)[1].tobytes()
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/solve/{urllib.parse.quote(window, safe='')}",
+        data=body,
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(json.load(e).get("error", str(e))) from e
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solver service shared by several game windows")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--gpu", action="store_true", help="Run the OCR models on the GPU")
+    parser.add_argument(
+        "--capture",
+        choices=sorted(BACKENDS),
+        default="windows",
+        help="Capture backend of the foreground windows, for requests carrying no image",
+    )
+    parser.add_argument(
+        "--quantize",
+        choices=QUANTIZE_MODES,
+        default="all",
+        help="Models run with dynamic int8 quantization on CPU",
+    )
+    parser.add_argument("--threads", type=int, help="Number of CPU threads used by torch")
+    parser.add_argument(
+        "--batch_wait",
+        type=float,
+        default=10.0,
+        help="Milliseconds concurrent recognitions wait for each other to run as one batch",
+    )
+    parser.add_argument(
+        "--ocr_cache",
+        choices=("off", "memory", "disk"),
+        default="memory",
+        help="Reuse the OCR results of unchanged crops, across restarts with disk",
+    )
+    parser.add_argument(
+        "--lexicon",
+        action="store_true",
+        help="Constrain hint recognition to the known clue names",
+    )
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help="Read the hint on a downscaled band first, at full resolution only if unsure",
+    )
+    parser.add_argument(
+        "--remote", action="store_true", help="Query the treasure hunt API on local misses"
+    )
+    parser.add_argument(
+        "--no_session",
+        action="store_true",
+        help="Read the coordinates on every request instead of confirming the predicted ones",
+    )
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    service = SolverService(args)
+    service.load()
+    handler = type("Handler", (_Handler,), {"service": service})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    logger.info(f"Solver service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Solver service stopped")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
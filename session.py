@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import time
+
+from models import Coordinates
+
+logger = logging.getLogger("session")
+
+
+class HuntSession:
+    """
+    State of the treasure hunt in progress, persisted so that a restart resumes it.
+
+    The session is idle until a step is solved. It then records the start position
+    and every (direction, clue, target) step, and predicts that the player stands on
+    the last target at the next press. The prediction only has to be confirmed by a
+    cheap read of the coordinates widget; a mismatch means the player did not travel
+    there, and the position read by the full OCR replaces it.
+    """
+
+    def __init__(self, path="data/session.json", max_age=3600):
+        """
+        :param path: JSON file the session is saved to after each step, kept in memory
+            only if None
+        :param max_age: Seconds without a step after which the hunt is considered over
+        """
+        self.path = path
+        self.max_age = max_age
+        self.start = None
+        self.steps = []
+        self.predicted = None
+        self.updated_at = 0.0
+        self.confirmed = 0
+        self.mismatches = 0
+        self._load()
+
+    @property
+    def active(self):
+        return self.start is not None and time.time() - self.updated_at < self.max_age
+
+    def _load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            start = Coordinates(x=data["start"][0], y=data["start"][1])
+            steps = list(data["steps"])
+            predicted = None
+            if data["predicted"] is not None:
+                predicted = Coordinates(x=data["predicted"][0], y=data["predicted"][1])
+            updated_at = float(data["updated_at"])
+        except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+            # A file from another version or cut short starts a new hunt
+            logger.warning(f"Ignoring unreadable session {self.path}: {e!r}")
+            return
+        self.start = start
+        self.steps = steps
+        self.predicted = predicted
+        self.updated_at = updated_at
+        if self.active:
+            logger.info(
+                f"Resumed hunt started at {self.start} after {len(self.steps)} steps, "
+                f"expecting {self.predicted}"
+            )
+
+    def save(self):
+        if self.path is None:
+            return
+        data = {
+            "start": list(self.start.get_coords()),
+            "steps": self.steps,
+            "predicted": None if self.predicted is None else list(self.predicted.get_coords()),
+            "updated_at": self.updated_at,
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(temporary, self.path)
+
+    def expected(self):
+        """
+        :return: Coordinates the player should be at, None when there is no prediction
+        """
+        return self.predicted if self.active else None
+
+    def reset(self):
+        self.start = None
+        self.steps = []
+        self.predicted = None
+        self.updated_at = 0.0
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def record(self, current_coords, direction, hint, target_coords):
+        """
+        Record a solved step and predict the position of the next press.
+
+        :param current_coords: Coordinates the step was solved from
+        :param target_coords: Solved target, None when the step could not be solved
+        """
+        expected = self.expected()
+        if expected is not None:
+            if current_coords == expected:
+                self.confirmed += 1
+            else:
+                self.mismatches += 1
+                logger.info(f"Expected to be at {expected} but read {current_coords}")
+        if not self.active:
+            self.reset()
+            self.start = current_coords
+            logger.info(f"New hunt started at {current_coords}")
+
+        self.steps.append(
+            {
+                "x": current_coords.x,
+                "y": current_coords.y,
+                "direction": direction,
+                "clue_id": hint.clue_id,
+                "hint": hint.text,
+                "target": None if target_coords is None else list(target_coords.get_coords()),
+            }
+        )
+        self.predicted = target_coords
+        self.updated_at = time.time()
+        self.save()
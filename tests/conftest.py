@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+CLUE_NAMES = {
+    1: "Affiche de carte au trésor",
+    2: "Gravure de dragodinde",
+    3: "Canard en plastique",
+    4: "Tissu à carreaux",
+    5: "Œuf de Tofu",
+}
+
+# (clue_id, x, y) positions, with several maps of a clue on the same row and column
+POSITIONS = [
+    (1, 0, 0),
+    (1, 4, 0),
+    (1, -7, 0),
+    (1, 0, 9),
+    (2, 3, 3),
+    (2, 3, -5),
+    (2, -12, 3),
+    (3, -23, 13),
+    (3, -23, 9),
+    (4, 5, 5),
+    (4, 15, 5),
+    (5, 0, -3),
+]
+
+
+@pytest.fixture
+def clue_dump(tmp_path):
+    """
+    :return: Path of a small clue dump in the format of data/clues_full.json
+    """
+    maps = {}
+    for clue_id, x, y in POSITIONS:
+        details = maps.setdefault(f"{x},{y}", {"position": {"x": x, "y": y}, "clues": []})
+        details["clues"].append(clue_id)
+    dump = {
+        "clues": [{"clue-id": clue_id, "name-fr": name} for clue_id, name in CLUE_NAMES.items()],
+        "maps": {str(i): details for i, details in enumerate(maps.values())},
+    }
+    path = tmp_path / "clues.json"
+    path.write_text(json.dumps(dump, ensure_ascii=False), encoding="utf-8")
+    return str(path)
@@ -0,0 +1,41 @@
+import cv2
+import numpy as np
+import pytest
+
+from arrow_classifier import classify_arrow
+
+ENDS = {
+    "RIGHT": ((8, 20), (32, 20)),
+    "LEFT": ((32, 20), (8, 20)),
+    "DOWN": ((20, 8), (20, 32)),
+    "UP": ((20, 32), (20, 8)),
+}
+
+
+def arrow(tail, head):
+    """
+    :return: Light arrow on a dark background, like the hunt panel arrows
+    """
+    image = np.full((40, 40, 3), 30, dtype=np.uint8)
+    cv2.arrowedLine(image, tail, head, (220, 220, 220), 3, tipLength=0.45)
+    return image
+
+
+@pytest.mark.parametrize("direction", sorted(ENDS))
+def test_cardinal_arrows(direction):
+    found, confidence = classify_arrow(arrow(*ENDS[direction]))
+    assert found == direction
+    assert 0 < confidence <= 1
+
+
+def test_tilted_arrow_is_less_confident():
+    _, straight = classify_arrow(arrow(*ENDS["RIGHT"]))
+    direction, tilted = classify_arrow(arrow((8, 30), (32, 14)))
+    assert direction == "RIGHT"
+    assert tilted < straight
+
+
+def test_no_arrow():
+    assert classify_arrow(np.full((40, 40, 3), 30, dtype=np.uint8)) == (None, 0.0)
+    assert classify_arrow(None) == (None, 0.0)
+    assert classify_arrow(np.zeros((0, 0, 3), dtype=np.uint8)) == (None, 0.0)
@@ -0,0 +1,38 @@
+from conftest import CLUE_NAMES, POSITIONS
+
+from bulk_solve import BulkSolver
+from corrections import Corrections
+from hint_index import HintIndex
+
+
+def solve(solver, **row):
+    return next(solver.solve([row]))
+
+
+def test_solve_row():
+    solver = BulkSolver(HintIndex(CLUE_NAMES, POSITIONS))
+    result = solve(solver, x=0, y=0, direction="right", hint="Affiche de carte au trésor")
+    assert (result["target_x"], result["target_y"], result["clue_id"]) == (4, 0, 1)
+    assert result["error"] is None
+
+
+def test_unknown_direction_is_reported():
+    solver = BulkSolver(HintIndex(CLUE_NAMES, POSITIONS))
+    result = solve(solver, x=0, y=0, direction="NORTH", hint="Canard en plastique")
+    assert result["target_x"] is None
+    assert result["error"] == "ValueError: Unknown direction NORTH"
+
+
+def test_candidates_are_bounded():
+    solver = BulkSolver(HintIndex(CLUE_NAMES, POSITIONS), max_hints=2)
+    for name in CLUE_NAMES.values():
+        solve(solver, x=0, y=0, direction="UP", hint=name)
+    assert list(solver.candidates) == list(CLUE_NAMES.values())[-2:]
+
+
+def test_corrections_apply(tmp_path):
+    corrections = Corrections(str(tmp_path / "corrections.jsonl"))
+    solver = BulkSolver(HintIndex(CLUE_NAMES, POSITIONS), corrections)
+    corrections.add(1, 2, 0)
+    result = solve(solver, x=0, y=0, direction="RIGHT", hint="Affiche de carte au trésor")
+    assert (result["target_x"], result["target_y"]) == (2, 0)
@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+import clue_data
+from clue_data import iter_sections, map_digest
+
+
+@pytest.fixture(params=[1, 7, 1 << 16])
+def chunk_size(request, monkeypatch):
+    # Small chunks cut keys, numbers and strings across buffer refills
+    monkeypatch.setattr(clue_data, "CHUNK_SIZE", request.param)
+    return request.param
+
+
+def test_streams_maps_member_by_member(clue_dump, chunk_size):
+    with open(clue_dump, encoding="utf-8") as f:
+        expected = json.load(f)
+    sections = list(iter_sections(clue_dump))
+    assert sections[0] == ("clues", None, expected["clues"])
+    assert [(key, value) for _, key, value in sections[1:]] == list(expected["maps"].items())
+    assert {section for section, _, _ in sections[1:]} == {"maps"}
+
+
+def test_empty_and_scalar_sections(tmp_path, chunk_size):
+    path = tmp_path / "dump.json"
+    path.write_text('{ "maps" : { } , "version" : 12345678 , "clues" : [ ] }', encoding="utf-8")
+    assert list(iter_sections(str(path))) == [("version", None, 12345678), ("clues", None, [])]
+
+
+def test_truncated_document(tmp_path, chunk_size):
+    path = tmp_path / "dump.json"
+    path.write_text('{"maps": {"0": {"position": {"x": 1', encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(iter_sections(str(path)))
+
+
+def test_map_digest_ignores_clue_order():
+    assert map_digest(1, 2, [3, 1, 2]) == map_digest(1, 2, {1, 2, 3})
+    assert map_digest(1, 2, [1]) != map_digest(2, 1, [1])
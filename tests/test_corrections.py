@@ -0,0 +1,79 @@
+import json
+
+import pytest
+from conftest import CLUE_NAMES, POSITIONS
+
+from api import API
+from corrections import Corrections
+from hint_index import HintIndex
+from models import Coordinates, Hint
+
+
+@pytest.fixture
+def index():
+    return HintIndex(CLUE_NAMES, POSITIONS)
+
+
+def test_import_tweaks(tmp_path, index):
+    tweaks = tmp_path / "tweaks"
+    tweaks.write_text(
+        "2025-03-15 01:08:59,462 - main - INFO - Target coordinates: (3, 14)\n"
+        "Gravue de dragodine - -23,13\n"
+        "Canard en plastique -13, 33\n",
+        encoding="utf-8",
+    )
+    corrections = Corrections(str(tmp_path / "corrections.jsonl"))
+    assert corrections.import_tweaks(str(tweaks), index) == 2
+    assert corrections.added == {2: {(-23, 13)}, 3: {(-13, 33)}}
+
+    # Importing again records nothing new
+    assert corrections.import_tweaks(str(tweaks), index) == 2
+    lines = (tmp_path / "corrections.jsonl").read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[0])["source"] == "tweaks"
+
+
+def test_overlay_changes_distances(tmp_path, index):
+    corrections = Corrections(str(tmp_path / "corrections.jsonl"))
+    index.corrections = corrections
+    assert index.distance(0, 0, "RIGHT", 1) == 4
+    corrections.remove(1, 4, 0)
+    assert index.distance(0, 0, "RIGHT", 1) == 0
+    corrections.add(1, 2, 0)
+    assert index.distance(0, 0, "RIGHT", 1) == 2
+    # The maps of the clue that were not corrected stay, other clues are unaffected
+    assert index.distance(0, 0, "DOWN", 1) == 9
+    assert index.distance(0, 0, "UP", 5) == 3
+
+
+def test_reload_reads_appended_records(tmp_path):
+    path = tmp_path / "corrections.jsonl"
+    writer = Corrections(str(path))
+    reader = Corrections(str(path))
+    writer.add(5, 1, 1)
+    with open(path, "a", encoding="utf-8") as f:
+        # A line still being written is left for the next reload
+        f.write('{"clue_id": 5, "x": 2, "y": 2, "action": "add"')
+    reader.reload()
+    assert reader.added == {5: {(1, 1)}}
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("}\n")
+    reader.reload()
+    assert reader.added == {5: {(1, 1), (2, 2)}}
+
+
+def test_overlay_adds_clue_without_maps(tmp_path, clue_dump):
+    with open(clue_dump, encoding="utf-8") as f:
+        dump = json.load(f)
+    dump["clues"].append({"clue-id": 6, "name-fr": "Rocher à sourire"})
+    with open(clue_dump, "w", encoding="utf-8") as f:
+        json.dump(dump, f)
+    api = API(Corrections(str(tmp_path / "corrections.jsonl")), path=str(tmp_path / "hunt.db"))
+    api.build_db(clue_dump)
+    assert api.get_index().clue_names[6] == "Rocher a sourire"
+
+    # Written by another process, picked up by the next lookup
+    Corrections(str(tmp_path / "corrections.jsonl")).add(6, 0, 4)
+    hint = Hint("Rocher a sourire")
+    assert api.find_distance(hint, Coordinates(x=0, y=0), "DOWN") == 4
+    assert api.get_hint_coordinates(Coordinates(x=0, y=0), "DOWN", hint) == Coordinates(x=0, y=4)
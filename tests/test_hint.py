@@ -0,0 +1,35 @@
+import pytest
+
+from models import Hint
+
+
+def test_sanitize_returns_a_new_hint():
+    hint = Hint("Aiguille à coudre ", clue_id=7)
+    sanitized = hint.sanitize()
+    assert sanitized.text == "Aiguille a coudre"
+    assert sanitized.clue_id == 7
+    assert hint.text == "Aiguille à coudre "
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("œuf de tofu", "oeuf de tofu"),
+        ("Tissu à carreaux", "Tissu a carreaux"),
+        ("Crâne d'Arakne", "Crane dArakne"),
+        ("  Canard en plastique  ", "Canard en plastique"),
+    ],
+)
+def test_sanitize_text(text, expected):
+    assert Hint(text).sanitize().text == expected
+
+
+def test_sanitize_is_idempotent():
+    hint = Hint("Tête de Bouftou").sanitize()
+    assert hint.sanitize() == hint
+
+
+def test_hint_is_immutable():
+    hint = Hint("Canard en plastique")
+    with pytest.raises(AttributeError):
+        hint.text = "Canard"
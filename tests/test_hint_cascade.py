@@ -0,0 +1,31 @@
+import pytest
+
+from hint_cascade import HintCascade
+from hint_matcher import HintMatcher
+from models import Hint
+
+
+@pytest.fixture
+def cascade():
+    matcher = HintMatcher({1: "Rose des sables", 2: "Rose des vents", 3: "Canard en plastique"})
+    return HintCascade(matcher)
+
+
+def test_accepts_a_confident_single_match(cascade):
+    assert cascade.accept(Hint("Canard en plastiqe"), 0.9)[0] == 3
+
+
+def test_escalates_unconfident_reads(cascade):
+    assert cascade.accept(Hint("Canard en plastique"), 0.2) is None
+    assert cascade.accept(None, 0.9) is None
+
+
+def test_escalates_ambiguous_reads(cascade):
+    # Both names contain the read, neither may be picked for the lookup
+    assert cascade.accept(Hint("Rose des"), 0.9) is None
+
+
+def test_band_follows_the_hint_line(cascade):
+    assert cascade.band_roi(400) == (0, 400)
+    cascade.remember([[10, 120], [200, 120], [200, 140], [10, 140]], panel_origin=(0, 20))
+    assert cascade.band_roi(400) == (80, 160)
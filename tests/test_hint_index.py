@@ -0,0 +1,87 @@
+import pytest
+from conftest import CLUE_NAMES, POSITIONS
+
+from api import API
+from hint_index import DIRECTIONS, MAX_DISTANCE, STEPS, HintIndex
+from models import Coordinates, Hint
+
+
+def nearest_map(x, y, direction, clue_id):
+    """
+    Reference answer: walk the cells of the direction one by one.
+    """
+    step_x, step_y = STEPS[direction]
+    positions = {(px, py) for cid, px, py in POSITIONS if cid == clue_id}
+    for distance in range(1, MAX_DISTANCE + 1):
+        if (x + step_x * distance, y + step_y * distance) in positions:
+            return distance
+    return 0
+
+
+@pytest.fixture
+def index():
+    return HintIndex(CLUE_NAMES, POSITIONS)
+
+
+def test_distance_matches_walk(index):
+    for clue_id in CLUE_NAMES:
+        for x in range(-30, 25):
+            for y in range(-20, 25):
+                for direction in DIRECTIONS:
+                    assert index.distance(x, y, direction, clue_id) == nearest_map(
+                        x, y, direction, clue_id
+                    ), (x, y, direction, clue_id)
+
+
+def test_distance_outside_grid(index):
+    assert index.distance(500, 500, "RIGHT", 1) == 0
+    assert index.distance(0, 0, "RIGHT", 99) == 0
+
+
+def test_matches_database_queries(index, clue_dump, tmp_path):
+    api = API(path=str(tmp_path / "hunt.db"))
+    api.build_db(clue_dump)
+    for x in range(-25, 20):
+        for y in range(-10, 15):
+            for direction in DIRECTIONS:
+                distances = api.nearest_clues(Coordinates(x=x, y=y), direction)
+                for clue_id in CLUE_NAMES:
+                    assert index.distance(x, y, direction, clue_id) == distances.get(clue_id, 0), (
+                        x,
+                        y,
+                        direction,
+                        clue_id,
+                    )
+
+
+def test_from_json_matches_database(clue_dump, tmp_path):
+    api = API(path=str(tmp_path / "hunt.db"))
+    api.build_db(clue_dump)
+    from_db = api.get_index()
+    from_json = HintIndex.from_json(clue_dump)
+    assert from_db.clue_names == from_json.clue_names
+    assert from_db.grids == from_json.grids
+
+
+def test_lookup(index):
+    assert index.lookup(Coordinates(x=-23, y=13), "UP", Hint("Canard en plastique")) == (
+        Coordinates(x=-23, y=9)
+    )
+    # Both maps are in range, the nearest one is the target
+    assert index.lookup(Coordinates(x=-2, y=0), "RIGHT", Hint("Affiche de carte au tresor")) == (
+        Coordinates(x=0, y=0)
+    )
+    assert index.lookup(Coordinates(x=0, y=0), "LEFT", Hint("Canard en plastique")) is None
+
+
+def test_lookup_approximate(index):
+    hint = Hint("Gravure de dragodnde")
+    assert index.lookup(Coordinates(x=0, y=3), "RIGHT", hint) == Coordinates(x=3, y=3)
+
+
+def test_best_candidate_prefers_score_then_distance(index):
+    candidates = [(4, 0.7), (1, 0.9), (2, 0.9)]
+    # Clue 1 is 4 cells right of (0, 0) and clue 2 has no map on that row
+    assert index.best_candidate(0, 0, "RIGHT", candidates) == (1, 0.9, 4)
+    assert index.best_candidate(0, 3, "RIGHT", candidates) == (2, 0.9, 3)
+    assert index.best_candidate(50, 50, "RIGHT", candidates) is None
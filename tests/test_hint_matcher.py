@@ -0,0 +1,66 @@
+import random
+
+import pytest
+from conftest import CLUE_NAMES
+
+from hint_matcher import HintMatcher, _pattern_masks, levenshtein
+
+
+def reference_levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            )
+        previous = current
+    return previous[-1]
+
+
+@pytest.fixture
+def matcher():
+    return HintMatcher(CLUE_NAMES)
+
+
+def test_levenshtein_matches_reference():
+    rng = random.Random(0)
+    for _ in range(500):
+        a = "".join(rng.choice("abcde ") for _ in range(rng.randrange(0, 40)))
+        b = "".join(rng.choice("abcde ") for _ in range(rng.randrange(0, 40)))
+        assert levenshtein(a, _pattern_masks(a), b) == reference_levenshtein(a, b), (a, b)
+
+
+def test_levenshtein_long_pattern():
+    # Patterns longer than a machine word rely on Python integers
+    a = "gravure de dragodinde " * 5
+    b = a.replace("d", "t")
+    assert levenshtein(a, _pattern_masks(a), b) == reference_levenshtein(a, b)
+
+
+def test_rank_exact(matcher):
+    assert matcher.rank("Gravure de dragodinde") == [(2, 1.0)]
+    assert matcher.rank("gravure de dragodinde ") == [(2, 1.0)]
+
+
+def test_rank_misread(matcher):
+    ranked = matcher.rank("Gravure de dragodnde")
+    assert ranked[0][0] == 2
+    assert 0.9 < ranked[0][1] < 1.0
+    assert all(score <= ranked[0][1] for _, score in ranked)
+
+
+def test_rank_truncated(matcher):
+    assert matcher.rank("carte au tresor")[0][0] == 1
+
+
+def test_rank_unrelated(matcher):
+    assert matcher.rank("") == []
+    assert matcher.rank("xyzw qrst") == []
+    assert matcher.match("xyzw qrst") is None
+
+
+def test_allowlist_spells_every_name(matcher):
+    for name in CLUE_NAMES.values():
+        assert set(name) <= set(matcher.allowlist)
+    assert set("EN COURS") <= set(matcher.allowlist)
@@ -0,0 +1,115 @@
+import threading
+
+import numpy as np
+import pytest
+
+import ocr_batch
+from ocr_batch import BatchedReader
+
+
+class FakeReader:
+    """
+    Recognizer answering each horizontal box with the mean gray level of its crop.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def recognize(self, image, horizontal_list, free_list, batch_size=1, **kwargs):
+        self.calls.append((image.shape, len(horizontal_list), batch_size, kwargs))
+        results = []
+        for x_min, x_max, y_min, y_max in horizontal_list:
+            box = [[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]]
+            text = str(int(image[y_min:y_max, x_min:x_max].mean()))
+            results.append((box, text, 1.0))
+        return results
+
+
+@pytest.fixture(autouse=True)
+def recognize_boxes(monkeypatch):
+    # The batched path calls the easyocr recognizer itself, answered by the fake here
+    def recognize_boxes(reader, image, horizontal_list, free_list, batch_size, **kwargs):
+        return reader.recognize(image, horizontal_list, free_list, batch_size, **kwargs)
+
+    monkeypatch.setattr(ocr_batch, "recognize_boxes", recognize_boxes)
+
+
+def recognize_concurrently(reader, images, boxes, settings=None):
+    """
+    :param settings: Keyword arguments of each recognition, the same for all if None
+    """
+    settings = settings or [{}] * len(images)
+    results = [None] * len(images)
+    barrier = threading.Barrier(len(images))
+
+    def recognize(i):
+        barrier.wait()
+        results[i] = reader.recognize(images[i], boxes[i], [], reformat=False, **settings[i])
+
+    threads = [threading.Thread(target=recognize, args=(i,)) for i in range(len(images))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_recognitions_share_one_call():
+    fake = FakeReader()
+    reader = BatchedReader(fake, max_wait=0.5)
+    images = [np.full((20 + 10 * i, 40 + i), 10 * (i + 1), dtype=np.uint8) for i in range(3)]
+    boxes = [[[0, 10, 0, 10], [10, 20, 5, 15]] for _ in images]
+
+    results = recognize_concurrently(reader, images, boxes)
+
+    assert len(fake.calls) == 1
+    shape, box_count, batch_size, _ = fake.calls[0]
+    assert shape == (20 + 30 + 40, 42)
+    assert box_count == batch_size == 6
+    for i, result in enumerate(results):
+        # Each caller gets its own boxes back, in its own image coordinates
+        assert [text for _, text, _ in result] == [str(10 * (i + 1))] * 2
+        assert [box[0] for box, _, _ in result] == [[0, 0], [10, 5]]
+    assert reader.stats()["recognitions"] == 3
+
+
+def test_different_settings_are_not_stacked():
+    fake = FakeReader()
+    reader = BatchedReader(fake, max_wait=0.5)
+    images = [np.zeros((10, 10), dtype=np.uint8) for _ in range(2)]
+    boxes = [[[0, 10, 0, 10]] for _ in images]
+
+    results = recognize_concurrently(
+        reader, images, boxes, [{"contrast_ths": 0.1}, {"contrast_ths": 0.2}]
+    )
+
+    assert len(fake.calls) == 2
+    assert all(len(result) == 1 for result in results)
+
+
+def test_color_images_bypass_batching():
+    fake = FakeReader()
+    reader = BatchedReader(fake)
+    image = np.zeros((10, 10, 3), dtype=np.uint8)
+    assert reader.recognize(image, [[0, 10, 0, 10]], [], reformat=False)[0][1] == "0"
+    assert reader.stats()["calls"] == 0
+
+
+def test_unknown_settings_bypass_batching():
+    fake = FakeReader()
+    reader = BatchedReader(fake)
+    image = np.zeros((10, 10), dtype=np.uint8)
+    reader.recognize(image, [[0, 10, 0, 10]], [], reformat=False, paragraph=True)
+    assert fake.calls[0][3] == {"reformat": False, "paragraph": True}
+    assert reader.stats()["calls"] == 0
+
+
+def test_errors_reach_every_caller():
+    class FailingReader(FakeReader):
+        def recognize(self, *args, **kwargs):
+            raise RuntimeError("recognizer failed")
+
+    reader = BatchedReader(FailingReader())
+    image = np.zeros((10, 10), dtype=np.uint8)
+    with pytest.raises(RuntimeError, match="recognizer failed"):
+        reader.recognize(image, [[0, 10, 0, 10]], [], reformat=False)
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from models import Coordinates, Hint
+from session import HuntSession
+
+START = Coordinates(x=-23, y=13)
+TARGET = Coordinates(x=-23, y=9)
+HINT = Hint("Canard en plastique", clue_id=3)
+
+
+def test_idle_session_expects_nothing():
+    assert HuntSession(path=None).expected() is None
+
+
+def test_expects_the_last_target():
+    session = HuntSession(path=None)
+    session.record(START, "UP", HINT, TARGET)
+    assert session.expected() == TARGET
+    assert session.start == START
+
+    session.record(TARGET, "RIGHT", HINT, None)
+    assert session.confirmed == 1
+    # An unsolved step leaves nothing to confirm at the next press
+    assert session.expected() is None
+
+
+def test_mismatch_is_counted():
+    session = HuntSession(path=None)
+    session.record(START, "UP", HINT, TARGET)
+    session.record(Coordinates(x=0, y=0), "UP", HINT, TARGET)
+    assert session.mismatches == 1
+    assert len(session.steps) == 2
+
+
+def test_expired_session(monkeypatch):
+    session = HuntSession(path=None, max_age=60)
+    session.record(START, "UP", HINT, TARGET)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert session.expected() is None
+
+    # The next step starts a new hunt
+    session.record(TARGET, "UP", HINT, START)
+    assert session.start == TARGET
+    assert len(session.steps) == 1
+    assert session.confirmed == 0
+
+
+def test_resumed_from_file(tmp_path):
+    path = str(tmp_path / "sessions" / "window.json")
+    HuntSession(path=path).record(START, "UP", HINT, TARGET)
+    resumed = HuntSession(path=path)
+    assert resumed.expected() == TARGET
+    assert resumed.steps[0]["clue_id"] == 3
+
+    resumed.reset()
+    assert HuntSession(path=path).expected() is None
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "{",
+        "[]",
+        '{"steps": []}',
+        '{"start": null, "steps": [], "predicted": null, "updated_at": 0}',
+        '{"start": [1], "steps": [], "predicted": null, "updated_at": 0}',
+    ],
+)
+def test_unreadable_file_is_ignored(tmp_path, content):
+    path = tmp_path / "session.json"
+    path.write_text(content, encoding="utf-8")
+    session = HuntSession(path=str(path))
+    assert session.expected() is None
+    assert session.start is None
+    assert session.steps == []
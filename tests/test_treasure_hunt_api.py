@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from api import API
+from hint_index import DIRECTIONS
+from models import Coordinates, Hint
+from treasure_hunt_api import ResponseCache, TreasureHuntAPI
+
+START = Coordinates(x=-23, y=13)
+
+
+class StubServer:
+    """
+    Local treasure hunt API answering every position with one clue 4 cells away.
+
+    failures holds the statuses returned before the first success, delay the
+    seconds waited before answering.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.failures = []
+        self.delay = 0.0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append(parse_qs(urlparse(self.path).query))
+                time.sleep(stub.delay)
+                if stub.failures:
+                    self.send_response(stub.failures.pop(0))
+                    self.end_headers()
+                    return
+                body = json.dumps(
+                    {"data": [{"distance": 4, "pois": [{"name": {"fr": "Canard en plastique"}}]}]}
+                ).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def server():
+    stub = StubServer()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def make_api(server, tmp_path):
+    def make_api(**kwargs):
+        cache = ResponseCache(path=str(tmp_path / "cache.db"), ttl=kwargs.pop("ttl", 3600))
+        return TreasureHuntAPI(base_url=server.url, cache=cache, backoff=0, **kwargs)
+
+    return make_api
+
+
+def test_solve(server, make_api):
+    target = make_api().solve(START, "UP", Hint("Canard en plastique"))
+    assert target == Coordinates(x=-23, y=9)
+    assert server.requests[0]["direction"] == ["UP"]
+
+
+def test_responses_are_cached(server, make_api):
+    api = make_api()
+    first = api.send_request(START, "UP")
+    assert api.send_request(START, "UP") == first
+    assert len(server.requests) == 1
+
+
+def test_expired_responses_are_fetched_again(server, make_api):
+    api = make_api(ttl=0)
+    api.send_request(START, "UP")
+    time.sleep(0.01)
+    api.send_request(START, "UP")
+    assert len(server.requests) == 2
+
+
+def test_server_errors_are_retried(server, make_api):
+    server.failures = [503, 502]
+    assert make_api(retries=3).send_request(START, "UP") is not None
+    assert len(server.requests) == 3
+
+
+def test_exhausted_retries(server, make_api):
+    server.failures = [503] * 3
+    assert make_api(retries=1).send_request(START, "UP") is None
+    assert len(server.requests) == 2
+
+
+def test_timeout(server, make_api):
+    server.delay = 0.5
+    assert make_api(timeout=(1, 0.1), retries=0).send_request(START, "UP") is None
+
+
+def test_prefetch_fills_the_cache(server, make_api):
+    api = make_api()
+    responses = api.prefetch(START)
+    assert set(responses) == set(DIRECTIONS)
+    assert sorted(request["direction"][0] for request in server.requests) == sorted(DIRECTIONS)
+    for direction in DIRECTIONS:
+        api.send_request(START, direction)
+    assert len(server.requests) == len(DIRECTIONS)
+
+
+def test_invalid_coordinates_are_not_sent(server, make_api):
+    assert make_api().send_request(Coordinates(x=None, y=None), "UP") is None
+    assert server.requests == []
+
+
+def test_remote_answer_prefetches_the_target(server, make_api, clue_dump, tmp_path):
+    api = API(remote=make_api(), path=str(tmp_path / "hunt.db"))
+    api.build_db(clue_dump)
+    # No local map is in range of this position
+    start = Coordinates(x=40, y=40)
+    target = api.get_hint_coordinates(start, "UP", Hint("Canard en plastique"))
+    assert target == Coordinates(x=40, y=36)
+
+    deadline = time.monotonic() + 5
+    while len(server.requests) < 1 + len(DIRECTIONS) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    prefetched = [(r["x"][0], r["y"][0], r["direction"][0]) for r in server.requests[1:]]
+    assert sorted(prefetched) == sorted(("40", "36", direction) for direction in DIRECTIONS)
@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+import pytest
+
+from layout import Layout
+from watcher import PanelWatcher, difference, fingerprint
+
+WIDTH, HEIGHT = 1280, 720
+
+
+def frame(coords="-23,13", steps=("Gravure de dragodinde",), noise=0, seed=0):
+    """
+    :return: Synthetic window with a coordinates widget and a hunt panel of steps
+    """
+    image = np.full((HEIGHT, WIDTH, 3), 40, dtype=np.uint8)
+    _, y_max, x_min, _ = Layout.default(WIDTH, HEIGHT).coords
+    cv2.putText(image, coords, (x_min + 4, y_max - 6), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (230,) * 3)
+    for i, step in enumerate(steps):
+        cv2.putText(image, step, (30, 140 + 24 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (230,) * 3)
+    if noise:
+        rng = np.random.default_rng(seed)
+        jitter = rng.integers(-noise, noise + 1, image.shape)
+        image = np.clip(image.astype(np.int16) + jitter, 0, 255).astype(np.uint8)
+    return image
+
+
+@pytest.fixture
+def watcher():
+    return PanelWatcher(window=None, solve=None)
+
+
+def test_difference():
+    a = fingerprint(frame())
+    assert difference(a, a) == 0.0
+    assert difference(a, None) == 1.0
+    assert difference(a, a[:-1]) == 1.0
+
+
+def test_unchanged_frame(watcher):
+    reference = watcher._fingerprints(frame())
+    assert not watcher._changed(watcher._fingerprints(frame()), reference)
+    # Capture noise stays below the pixel delta
+    assert not watcher._changed(watcher._fingerprints(frame(noise=10)), reference)
+    assert watcher._changed(reference, None)
+
+
+def test_new_coordinates(watcher):
+    reference = watcher._fingerprints(frame(coords="-23,13"))
+    assert watcher._changed(watcher._fingerprints(frame(coords="-23,12")), reference)
+
+
+def test_new_step(watcher):
+    reference = watcher._fingerprints(frame())
+    current = watcher._fingerprints(frame(steps=("Gravure de dragodinde", "Canard en plastique")))
+    assert watcher._changed(current, reference)
@@ -1,23 +1,100 @@
 import json
 import logging
 import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from models import Hint
+from hint_index import DIRECTIONS, STEPS
+from hint_matcher import HintMatcher
+from metrics import span
+from models import Coordinates, normalize
 
 load_dotenv()
 
 
+class ResponseCache:
+    """
+    On-disk cache of API responses keyed by (x, y, direction, lang).
+    """
+
+    def __init__(self, path="data/api_cache.db", ttl=7 * 24 * 3600):
+        """
+        :param path: SQLite file holding the responses
+        :param ttl: Seconds after which a cached response is fetched again
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                x INTEGER,
+                y INTEGER,
+                direction TEXT,
+                lang TEXT,
+                fetched_at REAL,
+                body TEXT,
+                PRIMARY KEY (x, y, direction, lang)
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, x, y, direction, lang):
+        with self._lock:
+            row = self.conn.execute(
+                """
+                SELECT fetched_at, body FROM responses
+                WHERE x = ? AND y = ? AND direction = ? AND lang = ?
+                """,
+                (x, y, direction, lang),
+            ).fetchone()
+        if row is None or time.time() - row[0] > self.ttl:
+            return None
+        return json.loads(row[1])
+
+    def put(self, x, y, direction, lang, response):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (x, y, direction, lang, time.time(), json.dumps(response)),
+            )
+
+
 class TreasureHuntAPI:
-    def __init__(self):
+    def __init__(
+        self,
+        base_url=None,
+        lang="fr",
+        timeout=(3.05, 10),
+        retries=3,
+        backoff=0.5,
+        cache=None,
+        corrections=None,
+    ):
+        """
+        :param base_url: Scheme and host of the API, https://HOST by default
+        :param lang: Language of the returned clue names
+        :param timeout: Connect and read timeouts in seconds
+        :param retries: Retries of failed connections and 429/5xx responses
+        :param backoff: Backoff factor between retries, in seconds
+        :param cache: ResponseCache to use, a default one is created if None
+        :param corrections: Corrections overlay the solved targets are recorded into
+        """
         self.logger = logging.getLogger("api_queries")
         self.host = os.getenv("HOST")
         self.token = os.getenv("TOKEN")
         self.origin = os.getenv("ORIGIN")
+        self.base_url = base_url or os.getenv("BASE_URL") or f"https://{self.host}"
+        self.lang = lang
+        self.timeout = timeout
         self.headers = {
-            "Host": self.host,
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:135.0) Gecko/20100101 Firefox/135.0",
             "Accept": "application/json, text/plain, */*",
             "Accept-Language": "en-US,en;q=0.5",
@@ -32,30 +109,79 @@ class TreasureHuntAPI:
             "Priority": "u=0",
             "TE": "trailers",
         }
+        if self.host:
+            self.headers["Host"] = self.host
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=len(DIRECTIONS),
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=backoff,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET",),
+            ),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.cache = cache or ResponseCache()
+        # Sized for the four directions of a position to be fetched side by side
+        self.executor = ThreadPoolExecutor(
+            max_workers=len(DIRECTIONS), thread_name_prefix="api_prefetch"
+        )
+        self.corrections = corrections
+        self.matcher = HintMatcher.from_json("data/clues_full.json")
 
     def send_request(self, current_coords, direction):
-        if current_coords.are_valid():
-            request = f"https://{self.host}/treasure-hunt?x={current_coords.x}&y={current_coords.y}&direction={direction}&$limit=50&lang=fr"
-        else:
+        if not current_coords.are_valid():
             self.logger.warning(f"Invalid coordinates {current_coords}")
             return None
 
+        x, y = current_coords.x, current_coords.y
+        cached = self.cache.get(x, y, direction, self.lang)
+        if cached is not None:
+            self.logger.debug(f"Cached response for {current_coords} {direction}")
+            return cached
+
+        params = {"x": x, "y": y, "direction": direction, "$limit": 50, "lang": self.lang}
         try:
-            response = requests.get(request, headers=self.headers)
+            with span("remote_request"):
+                response = self.session.get(
+                    f"{self.base_url}/treasure-hunt", params=params, timeout=self.timeout
+                )
             response.raise_for_status()  # Raises an HTTPError for bad responses (4xx, 5xx)
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            body = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
             self.logger.error(f"API request failed: {e}")
             return None
 
+        self.cache.put(x, y, direction, self.lang, body)
+        return body
+
+    def prefetch(self, current_coords, wait=True):
+        """
+        Fetch the four directions of a position concurrently, so that the next step
+        is answered from the cache.
+
+        :param wait: Wait for the responses, else return right away
+        :return: Dictionary of direction to response, None when not waiting
+        """
+        futures = {
+            direction: self.executor.submit(self.send_request, current_coords, direction)
+            for direction in DIRECTIONS
+        }
+        if not wait:
+            return None
+        return {direction: future.result() for direction, future in futures.items()}
+
     def parse_response_to_dict(self, response):
         self.logger.info("Parsing API response to dictionary")
         distances = {}
-        partial_matches = {}  # New dictionary to handle partial matches
 
         if not response or "data" not in response:
             self.logger.warning("Empty or invalid API response")
-            return {}, {}
+            return {}
         # Save the response as JSON in debug directory
         if logging.getLogger().isEnabledFor(logging.DEBUG):
             debug_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "debug")
@@ -64,41 +190,64 @@ class TreasureHuntAPI:
                 json.dump(response, response_file, indent=4)
 
         for obj in response["data"]:
+            distance = obj["distance"]
             for poi in obj["pois"]:
-                hint = Hint(poi["name"]["fr"]).sanitize()
-                distance = obj["distance"]
-
-                if hint.text in distances.keys():
-                    if distances[hint.text] < distance:
-                        distance = distances[hint.text]
-
-                # Store the full name as key with its distance
-                distances[hint.text] = distance
-
-                # Generate partial keys for matching
-                words = hint.text.split()
-                for i in range(1, len(words) + 1):
-                    for j in range(len(words) - i + 1):
-                        partial_key = " ".join(words[j : j + i])
-                        partial_matches[partial_key] = hint.text  # Map partial key to full name
+                # Names repeat across responses, their sanitized form is computed once
+                name = normalize(poi["name"]["fr"])
+                if distance < distances.get(name, distance + 1):
+                    distances[name] = distance
 
         self.logger.info("Parsed distances dictionary:")
-        for hint in distances:
-            self.logger.info(f"{hint}: {distances[hint]}")
-        return distances, partial_matches
+        for hint, distance in distances.items():
+            self.logger.info(f"{hint}: {distance}")
+        return distances
 
-    def find_distance(self, hint, distances, partial_matches):
+    def find_distance(self, hint, distances):
+        match = self._find_clue(hint, distances)
+        return match[1] if match else None
+
+    def _find_clue(self, hint, distances, clue_id=None):
         self.logger.info(f"Searching for distance for hint: '{hint}'")
 
+        # A hint recognized against the lexicon already knows its clue
+        if clue_id is not None and self.matcher.names.get(clue_id) in distances:
+            full_name = self.matcher.names[clue_id]
+            return full_name, distances[full_name]
+
         # First check for exact match
         if hint in distances:
-            return distances[hint]
+            return hint, distances[hint]
 
-        # Then check for partial match
-        if hint in partial_matches:
-            full_name = partial_matches[hint]
-            return distances[full_name]
+        # Then check the closest clue names returned by the API
+        for candidate_id, score in self.matcher.rank(hint):
+            full_name = self.matcher.names[candidate_id]
+            if full_name in distances:
+                self.logger.info(f"Matched '{hint}' to '{full_name}' ({score:.2f})")
+                return full_name, distances[full_name]
 
         self.logger.warning(f"No distance found for hint '{hint}'")
 
         return None
+
+    def solve(self, current_coords, direction, hint):
+        """
+        Find the target of a sanitized hint through the API, recording it in the
+        corrections overlay so that the next lookup is answered locally.
+
+        :return: Target Coordinates, or None
+        """
+        distances = self.parse_response_to_dict(self.send_request(current_coords, direction))
+        match = self._find_clue(hint.text, distances, hint.clue_id)
+        if match is None:
+            return None
+
+        full_name, distance = match
+        step_x, step_y = STEPS[direction]
+        target = Coordinates(
+            x=current_coords.x + step_x * distance,
+            y=current_coords.y + step_y * distance,
+        )
+        clue_id = self.matcher.exact.get(full_name.lower())
+        if self.corrections is not None and clue_id is not None:
+            self.corrections.add(clue_id, target.x, target.y, source="treasure_hunt_api")
+        return target
@@ -0,0 +1,162 @@
+import logging
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from layout import Layout, capture_roi
+
+logger = logging.getLogger("watcher")
+
+# Factor the compared regions are downscaled by, small enough to keep text strokes
+FINGERPRINT_SCALE = 0.5
+
+# Gray level difference above which a fingerprint pixel counts as changed
+PIXEL_DELTA = 40
+
+
+def fingerprint(crop):
+    """
+    :return: Downscaled grayscale version of a crop, cheap to compare
+    """
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(
+        gray, None, fx=FINGERPRINT_SCALE, fy=FINGERPRINT_SCALE, interpolation=cv2.INTER_AREA
+    )
+    return small.astype(np.int16)
+
+
+def difference(a, b):
+    """
+    :return: Fraction of the pixels of two fingerprints that changed, 1.0 if they are
+        not comparable
+    """
+    if a is None or b is None or a.shape != b.shape:
+        return 1.0
+    return float(np.mean(np.abs(a - b) > PIXEL_DELTA))
+
+
+class PanelWatcher:
+    """
+    Solve automatically whenever the hunt panel changes.
+
+    A capture thread grabs the window at a fixed rate and compares downscaled copies
+    of the coordinates widget and of the hunt panel, which holds the "EN COURS" step,
+    with the last solved ones. Each region is compared on the fraction of its pixels
+    that changed, so that a new coordinate value or a single step line, a few percent
+    of the panel, is noticed rather than averaged away. A frame is handed to the
+    solve thread once a region differs from the solved one and has stopped changing.
+    The queue holds a single frame, so a solve that is still running only ever picks
+    up the latest screen.
+    """
+
+    def __init__(
+        self,
+        window,
+        solve,
+        layouts=None,
+        fps=2.0,
+        coords_threshold=0.01,
+        panel_threshold=0.002,
+    ):
+        """
+        :param window: CaptureBackend of the game window
+        :param solve: Callable receiving a captured window image
+        :param layouts: LayoutCache giving the coordinates and hunt panel ROIs
+        :param fps: Number of captures per second
+        :param coords_threshold: Fraction of changed pixels above which the coordinates
+            widget has changed
+        :param panel_threshold: Fraction of changed pixels above which the hunt panel
+            has changed, a new step line covers about half a percent of it
+        """
+        self.window = window
+        self.solve = solve
+        self.layouts = layouts
+        self.interval = 1 / fps
+        self.thresholds = {"coords": coords_threshold, "panel": panel_threshold}
+        self.frames = queue.Queue(maxsize=1)
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def _fingerprints(self, image):
+        height, width = image.shape[:2]
+        layout = self.layouts.get(width, height) if self.layouts else None
+        layout = layout or Layout.default(width, height)
+        fingerprints = {}
+        for region, (y_min, y_max, x_min, x_max) in (
+            ("coords", layout.coords),
+            ("panel", layout.hunt_panel),
+        ):
+            fingerprints[region] = fingerprint(image[y_min:y_max, x_min:x_max])
+        return fingerprints
+
+    def _changed(self, current, reference):
+        """
+        :return: Whether a region of current differs from reference
+        """
+        if reference is None:
+            return True
+        return any(
+            difference(current[region], reference[region]) > threshold
+            for region, threshold in self.thresholds.items()
+        )
+
+    def _offer(self, image):
+        try:
+            self.frames.put_nowait(image)
+        except queue.Full:
+            try:
+                self.frames.get_nowait()
+                logger.debug("Dropped a stale frame")
+            except queue.Empty:
+                pass
+            self.frames.put_nowait(image)
+
+    def _capture_loop(self):
+        previous = None
+        solved = None
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            try:
+                image = self.window.capture_window(capture_roi)
+                current = self._fingerprints(image)
+                # Wait for transitions to settle before solving
+                stable = previous is not None and not self._changed(current, previous)
+                if stable and self._changed(current, solved):
+                    logger.info("Hunt panel changed, solving")
+                    solved = current
+                    # The capture buffer is reused by the next grab
+                    self._offer(image.copy())
+                previous = current
+            except Exception as e:
+                logger.error(f"Capture failed: {e}", exc_info=True)
+            self.stop_event.wait(max(self.interval - (time.perf_counter() - start), 0))
+
+    def _solve_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                image = self.frames.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.solve(image)
+            except Exception as e:
+                logger.error(f"Solve failed: {e}", exc_info=True)
+
+    def start(self):
+        self.stop_event.clear()
+        self.threads = [
+            threading.Thread(target=self._capture_loop, name="watch-capture", daemon=True),
+            threading.Thread(target=self._solve_loop, name="watch-solve", daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+        logger.info(f"Watching the hunt panel every {self.interval:.2f} seconds")
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
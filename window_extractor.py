@@ -1,32 +1,34 @@
 import logging
 
-import cv2
-import numpy as np
 import psutil
-import pyautogui
 import pygetwindow as gw
 import win32gui
 import win32process
 
+from capture import ScreenCapture
+
 logger = logging.getLogger("window_extractor")
 
 
-class WindowInformationExtractor:
-    def __init__(self, window_title=None):
+class WindowInformationExtractor(ScreenCapture):
+    def __init__(self, window_title=None, activate=True):
         """
         Initialize window information extraction.
 
         :param window_title: Title or partial title of the window to analyze
+        :param activate: Bring the window to the foreground once found
         """
+        super().__init__()
         self.window = None
 
-        self.find_window(window_title)
+        self.find_window(window_title, activate)
 
-    def find_window(self, window_title):
+    def find_window(self, window_title, activate=True):
         """
         Find a window by its title.
 
         :param window_title: Title or partial title of the window
+        :param activate: Bring the window to the foreground once found
         """
         if window_title:
             # Find windows matching the title (case-insensitive)
@@ -40,39 +42,34 @@ class WindowInformationExtractor:
                     f"No window found with title containing: {window_title}"
                 )
 
+            if len(matching_windows) > 1:
+                logger.warning(
+                    f"{len(matching_windows)} windows match '{window_title}', using the first. "
+                    f"Give a more specific title to pick another: {matching_windows}"
+                )
+
             # Use the first matching window
             self.window = gw.getWindowsWithTitle(matching_windows[0])[0]
             logger.info(f"Found window: {self.window.title}")
 
-            # Activate and bring the window to the foreground
-            self.window.activate()
+            if activate:
+                # Activate and bring the window to the foreground
+                self.window.activate()
         else:
             logger.warning("No window title specified. Please provide a window title.")
             print("No window title specified. Please provide a window title.")
 
-    def capture_window(self):
-        """
-        Capture the specified window.
-
-        :return: Screenshot of the window as a numpy array
-        """
+    def window_size(self):
         if not self.window:
             logger.error("No window selected for capture")
             raise ValueError("No window selected for capture")
+        return self.window.width, self.window.height
 
-        # Get window position and size
-        x, y, width, height = (
-            self.window.left,
-            self.window.top,
-            self.window.width,
-            self.window.height,
-        )
-
-        # Capture the specific window area
-        screenshot = pyautogui.screenshot(region=(x, y, width, height))
+    def window_origin(self):
+        return self.window.left, self.window.top
 
-        # Convert PIL Image to numpy array for OpenCV compatibility
-        return cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+    def is_foreground(self):
+        return self.window.isActive
 
     def get_window_details(self):
         """
@@ -0,0 +1,194 @@
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger("worker")
+
+MAX_RESTART_DELAY = 30.0
+
+
+def _frame(request):
+    """
+    :return: Window frame of a request, its crop pasted back at its place
+    """
+    crop = request["image"]
+    if crop is None or request["size"] is None:
+        return crop
+    frame = np.zeros((*request["size"], *crop.shape[2:]), dtype=crop.dtype)
+    top, left = request["origin"]
+    frame[top : top + crop.shape[0], left : left + crop.shape[1]] = crop
+    return frame
+
+
+def _serve(factory, requests, coalesced, log_queue, log_level):
+    """
+    Entry point of the worker process.
+
+    :param factory: Picklable callable returning the solve function, called once
+    :param coalesced: Shared counter of the requests superseded before being solved
+    """
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(log_level)
+
+    solve = factory()
+    while True:
+        request = requests.get()
+        # Presses made while the previous one was solved are superseded by the newest
+        while request is not None:
+            try:
+                newer = requests.get_nowait()
+            except queue.Empty:
+                break
+            coalesced.value += 1
+            logger.debug("Replaced a pending request")
+            request = newer
+        if request is None:
+            return
+        logger.debug(f"Solving request queued {time.time() - request['queued_at']:.2f}s ago")
+        try:
+            solve(_frame(request))
+        except Exception as e:
+            logger.error(f"Solve failed: {e}", exc_info=True)
+
+
+class SolverWorker:
+    """
+    Long-lived process running the capture, OCR and lookup pipeline.
+
+    Submitting never blocks: the worker drains the requests queued while it was
+    solving and only solves the newest, so only the latest frame is solved however
+    often the hotkey fires. Frames are cropped to a region of interest before being
+    sent, so that a full window is not pickled through the pipe. The worker logs
+    through the parent handlers, and a supervisor thread restarts it whenever it
+    dies without being asked to.
+    """
+
+    def __init__(self, factory, restart_delay=1.0, roi=None):
+        """
+        :param factory: Picklable callable run in the worker, returning a callable
+            that solves an image, or captures the window itself when given None
+        :param restart_delay: Seconds waited before restarting a crashed worker
+        :param roi: (y_min, y_max, x_min, x_max) region of the submitted frames sent
+            to the worker, or a callable returning it from the frame (width, height).
+            The rest of the frame reaches the solve function blank. Whole frames are
+            sent if None.
+        """
+        self.factory = factory
+        self.restart_delay = restart_delay
+        self.roi = roi
+        self.context = multiprocessing.get_context("spawn")
+        self.log_queue = self.context.Queue()
+        self.listener = logging.handlers.QueueListener(
+            self.log_queue, *logging.getLogger().handlers, respect_handler_level=True
+        )
+        self.requests = None
+        self.process = None
+        self.submitted = 0
+        # Written by the worker only, a lock held by a killed worker would never be freed
+        self.coalesced = self.context.Value("i", 0, lock=False)
+        self.restarts = 0
+        self.stop_event = threading.Event()
+        self.supervisor = None
+        self._lock = threading.Lock()
+
+    def _spawn(self):
+        with self._lock:
+            # A process killed while reading may leave the queue locked, use a new one
+            self.requests = self.context.Queue()
+            self.process = self.context.Process(
+                target=_serve,
+                args=(
+                    self.factory,
+                    self.requests,
+                    self.coalesced,
+                    self.log_queue,
+                    logging.getLogger().level,
+                ),
+                name="solver-worker",
+                daemon=True,
+            )
+            self.process.start()
+        logger.info(f"Solver worker started with pid {self.process.pid}")
+        return self.process
+
+    def _supervise(self):
+        process = self.process
+        quick_failures = 0
+        while True:
+            started = time.monotonic()
+            process.join()
+            if self.stop_event.is_set():
+                break
+            self.restarts += 1
+            # Back off while the worker keeps dying right after being started
+            if time.monotonic() - started < MAX_RESTART_DELAY:
+                quick_failures += 1
+            else:
+                quick_failures = 0
+            delay = min(self.restart_delay * 2 ** max(quick_failures - 1, 0), MAX_RESTART_DELAY)
+            logger.error(
+                f"Solver worker exited with code {process.exitcode}, "
+                f"restarting in {delay:.1f} seconds"
+            )
+            if self.stop_event.wait(delay):
+                break
+            process = self._spawn()
+
+    def _put(self, request):
+        with self._lock:
+            self.requests.put(request)
+
+    def _crop(self, image):
+        """
+        :return: Tuple of (crop, (top, left), (height, width)) of a frame to send
+        """
+        if image is None or self.roi is None:
+            return image, None, None
+        height, width = image.shape[:2]
+        roi = self.roi(width, height) if callable(self.roi) else self.roi
+        y_min, y_max, x_min, x_max = roi
+        y_min, x_min = max(y_min, 0), max(x_min, 0)
+        return image[y_min:y_max, x_min:x_max], (y_min, x_min), (height, width)
+
+    def submit(self, image=None):
+        """
+        Queue a solve without waiting for it.
+
+        :param image: Window capture, None to let the worker capture the window
+        """
+        if self.requests is None:
+            raise RuntimeError("The solver worker is not started")
+        self.submitted += 1
+        crop, origin, size = self._crop(image)
+        self._put({"image": crop, "origin": origin, "size": size, "queued_at": time.time()})
+
+    def start(self):
+        self.stop_event.clear()
+        self.listener.start()
+        self._spawn()
+        self.supervisor = threading.Thread(
+            target=self._supervise, name="worker-supervisor", daemon=True
+        )
+        self.supervisor.start()
+
+    def stop(self, timeout=5.0):
+        self.stop_event.set()
+        if self.process is not None:
+            self._put(None)
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+        if self.supervisor is not None:
+            self.supervisor.join()
+            self.supervisor = None
+        self.listener.stop()
+        logger.info(
+            f"Solver worker stopped after {self.submitted} requests, "
+            f"{self.coalesced.value} coalesced, {self.restarts} restarts"
+        )